@@ -1,16 +1,37 @@
 # map_generator.py
+from functools import lru_cache
 from pathlib import Path
 from staticmap import StaticMap, CircleMarker
 
+# Cache em disco dos tiles do OSM (staticmap baixa via requests)
+TILE_CACHE_PATH = Path.home() / ".cache" / "geojourney" / "osm_tiles"
+TILE_CACHE_EXPIRE_S = 30 * 86400
+
+try:
+    import requests_cache
+    TILE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    requests_cache.install_cache(str(TILE_CACHE_PATH), backend='sqlite', expire_after=TILE_CACHE_EXPIRE_S)
+except Exception:
+    # Sem requests_cache os tiles são baixados a cada execução
+    pass
+
+
+@lru_cache(maxsize=256)
+def _render_map(lat: float, lon: float, zoom: int, size: tuple):
+    # staticmap espera (lon, lat)
+    map_obj = StaticMap(size[0], size[1], url_template='https://a.tile.openstreetmap.org/{z}/{x}/{y}.png')
+    marker = CircleMarker((lon, lat), 'red', 10)
+    map_obj.add_marker(marker)
+    return map_obj.render(zoom=zoom, center=(lon, lat))
+
+
 def generate_map_image(lat: float, lon: float, output_path: Path, zoom_start: int = 15, size: tuple = (200, 200)):
     """
     Gera um PNG de mapa centrado em (lat, lon) com marcador e salva em output_path.
     Usa staticmap (OpenStreetMap) sem depender de API externa.
+    Pontos próximos (mesmas coordenadas arredondadas a 3 casas, ~100 m)
+    reaproveitam o mapa já renderizado.
     """
-    # staticmap espera (lon, lat)
-    map_obj = StaticMap(size[0], size[1], url_template='https://a.tile.openstreetmap.org/{z}/{x}/{y}.png')
-    marker = CircleMarker((lon, lat), 'red', 10)
-    map_obj.add_marker(marker)
     # O zoom 15 é mais próximo do padrão de visualização urbana
-    image = map_obj.render(zoom=zoom_start, center=(lon, lat))
-    image.save(str(output_path))
\ No newline at end of file
+    image = _render_map(round(lat, 3), round(lon, 3), zoom_start, tuple(size))
+    image.save(str(output_path))
@@ -1,28 +1,180 @@
 from pathlib import Path
-from moviepy.editor import ImageClip, VideoFileClip, concatenate_videoclips, CompositeVideoClip
 from tqdm import tqdm
+from PIL import Image, ImageOps
 from utils.geo_utils import extract_gps_from_image
 from analysis.map_generator import generate_map_image
-from pathlib import Path
+from utils.exif import get_et
+import shutil
+import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.heic']
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.mkv']
+MAP_SIZE = (200, 200)
+# Tag EXIF Orientation; valores 5 a 8 trocam largura e altura
+EXIF_ORIENTATION = 0x0112
+MAP_WORKERS = 8
+FPS = 24
+AUDIO_RATE = 44100
+# Quantos segmentos o ffmpeg codifica ao mesmo tempo
+ENCODE_WORKERS = 4
+# Com encoder por hardware: GPUs de consumo limitam as sessões NVENC
+# simultâneas (3 em drivers mais antigos), e uma sessão recusada derruba o slideshow
+HW_ENCODE_WORKERS = 2
+
+# Encoders H.264 por ordem de preferência (hardware primeiro) e seus parâmetros
+ENCODER_PARAMS = {
+    "h264_nvenc": ["-preset", "p4", "-tune", "hq"],
+    "h264_qsv": ["-preset", "faster"],
+    "h264_videotoolbox": [],
+    "libx264": ["-preset", "veryfast"],
+}
+
+def prepare_image(src: Path, dst: Path, width: int, height: int, map_path: Path = None) -> Path:
+    """
+    Monta o frame final da foto uma única vez: redimensiona para caber em width x height,
+    centraliza num fundo preto desse tamanho e cola o mapa (se houver) no canto
+    inferior direito. Salva em dst (JPEG), pronto para virar um segmento de vídeo.
+    """
+    with Image.open(src) as img:
+        # Dimensões já com a orientação do EXIF (foto em retrato de celular);
+        # lidas do cabeçalho para o draft ainda valer
+        rotated = img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8)
+        src_w, src_h = (img.height, img.width) if rotated else img.size
+        scale = min(width / src_w, height / src_h)
+        new_w = max(1, round(src_w * scale))
+        new_h = max(1, round(src_h * scale))
+        # Para JPEG, decodifica já reduzido (escala 1/2, 1/4, 1/8); o draft é
+        # antes da rotação, nas dimensões armazenadas
+        img.draft('RGB', (new_h, new_w) if rotated else (new_w, new_h))
+        img = ImageOps.exif_transpose(img).convert('RGB').resize((new_w, new_h), Image.BILINEAR)
+
+    frame = Image.new('RGB', (width, height))
+    frame.paste(img, ((width - new_w) // 2, (height - new_h) // 2))
+    if map_path:
+        with Image.open(map_path) as map_img:
+            # 10px de margem
+            frame.paste(map_img.convert('RGB'), (width - map_img.width - 10, height - map_img.height - 10))
+    frame.save(dst, 'JPEG', quality=90)
+    return dst
+
+def run_ffmpeg(args: list):
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+def has_audio(src: Path) -> bool:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries", "stream=index", "-of", "csv=p=0", str(src)],
+        capture_output=True, text=True)
+    return bool(result.stdout.strip())
 
-def create_slideshow(media_files: list[Path], output_path: Path, resolution: str = "1280x720", image_duration: int = 5, skip_n: int = 5):
+@lru_cache(maxsize=None)
+def encoder_works(encoder: str) -> bool:
+    """Testa o encoder com um frame sintético (estar listado não garante GPU/driver)."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i", "color=size=256x256:rate=1",
+         "-frames:v", "1", "-c:v", encoder, "-f", "null", "-"],
+        capture_output=True)
+    return result.returncode == 0
+
+def pick_encoder(requested: str = "auto") -> str:
+    """Retorna o encoder pedido ou, em "auto", o primeiro de ENCODER_PARAMS que funciona nesta máquina."""
+    if requested != "auto":
+        return requested
+    available = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    for encoder in ENCODER_PARAMS:
+        if encoder in available and encoder_works(encoder):
+            return encoder
+    return "libx264"
+
+# Todos os segmentos saem com os mesmos parâmetros (codec, fps, timescale, áudio)
+# para que o concat demuxer possa juntá-los com -c copy.
+# shortest: só quando o áudio é o anullsrc (infinito); num vídeo com áudio
+# próprio mais curto, -shortest cortaria o vídeo no fim do áudio.
+def _segment_output_args(dst: Path, encoder: str, shortest: bool = False) -> list:
+    return [
+        "-c:v", encoder, *ENCODER_PARAMS.get(encoder, []), "-pix_fmt", "yuv420p", "-r", str(FPS),
+        "-c:a", "aac", "-ar", str(AUDIO_RATE), "-ac", "2",
+        "-video_track_timescale", "90000", *(["-shortest"] if shortest else []), str(dst),
+    ]
+
+def encode_image_segment(frame: Path, dst: Path, duration: float, encoder: str = "libx264") -> Path:
+    """Gera um MP4 de duration segundos com a imagem parada e áudio mudo."""
+    run_ffmpeg([
+        "-loop", "1", "-t", str(duration), "-i", str(frame),
+        "-f", "lavfi", "-t", str(duration), "-i", f"anullsrc=r={AUDIO_RATE}:cl=stereo",
+        "-map", "0:v:0", "-map", "1:a:0", "-vf", "setsar=1",
+        *_segment_output_args(dst, encoder, shortest=True),
+    ])
+    return dst
+
+def encode_video_segment(src: Path, dst: Path, width: int, height: int, encoder: str = "libx264") -> Path:
+    """
+    Recodifica o vídeo para width x height (com tarjas) no formato comum dos segmentos.
+    Com h264_nvenc, decodifica na GPU (NVDEC); se falhar, repete com decodificação na CPU.
+    """
+    # fps primeiro: frames excedentes (fonte de 30/60 fps) são descartados antes de escalar
+    vf = (f"fps={FPS},scale={width}:{height}:force_original_aspect_ratio=decrease,"
+          f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+    silent = not has_audio(src)
+    if not silent:
+        extra_inputs = []
+        maps = ["-map", "0:v:0", "-map", "0:a:0"]
+    else:
+        extra_inputs = ["-f", "lavfi", "-i", f"anullsrc=r={AUDIO_RATE}:cl=stereo"]
+        maps = ["-map", "0:v:0", "-map", "1:a:0"]
+    args = ["-i", str(src), *extra_inputs, *maps, "-vf", vf, *_segment_output_args(dst, encoder, shortest=silent)]
+
+    if encoder == "h264_nvenc":
+        try:
+            run_ffmpeg(["-hwaccel", "cuda", *args])
+            return dst
+        except subprocess.CalledProcessError:
+            pass
+    run_ffmpeg(args)
+    return dst
+
+def concat_segments(segments: list[Path], list_path: Path, output_path: Path):
+    """Junta os segmentos com o concat demuxer do ffmpeg, sem recodificar."""
+    with open(list_path, "w", encoding="utf-8") as fh:
+        for seg in segments:
+            escaped = str(seg.resolve()).replace("'", "'\\''")
+            fh.write(f"file '{escaped}'\n")
+    run_ffmpeg(["-f", "concat", "-safe", "0", "-i", str(list_path), "-c", "copy", str(output_path)])
+
+def create_slideshow(media_files: list[Path], output_path: Path, resolution: str = "1280x720", image_duration: int = 5, skip_n: int = 5, encoder: str = "auto",
+                     gps_by_path: dict[Path, tuple[float, float]] = None):
+    """
+    Gera o vídeo de slideshow. gps_by_path (como retornado por list_media_with_gps)
+    evita reler os metadados de cada foto; sem ele o GPS é lido arquivo a arquivo.
+    """
     width, height = map(int, resolution.split("x"))
-    clips = []
+    encoder = pick_encoder(encoder)
+    print(f"Encoder: {encoder}")
 
     # Ordena pelas datas do EXIF (ou usa mtime se não houver)
+    # Uma única chamada ao exiftool para todos os arquivos, pedindo só a data
+    # (-fast; o -fast2 para no mdat e perde metadados de MP4/MOV com moov no fim)
+    timestamps_by_path = {}
+    try:
+        from datetime import datetime
+        metas = get_et().get_tags([str(f) for f in media_files], tags=["EXIF:DateTimeOriginal"], params=["-fast", "-n"])
+        for item in metas or []:
+            value = item.get('EXIF:DateTimeOriginal')
+            if not value:
+                continue
+            try:
+                timestamps_by_path[item.get('SourceFile')] = datetime.strptime(str(value), '%Y:%m:%d %H:%M:%S').timestamp()
+            except ValueError:
+                pass
+    except Exception:
+        pass
+
     def get_timestamp(f):
-        try:
-            from exiftool import ExifToolHelper
-            with ExifToolHelper() as et:
-                metadata = et.get_metadata(str(f))
-                if metadata and 'EXIF:DateTimeOriginal' in metadata[0]:
-                    from datetime import datetime
-                    return datetime.strptime(metadata[0]['EXIF:DateTimeOriginal'], '%Y:%m:%d %H:%M:%S').timestamp()
-        except Exception:
-            pass
-        return f.stat().st_mtime
-    from tqdm import tqdm
+        ts = timestamps_by_path.get(str(f))
+        return ts if ts is not None else f.stat().st_mtime
+
     timestamps = []
     for f in tqdm(media_files, desc="Ordenando por data EXIF"):
         timestamps.append((f, get_timestamp(f)))
@@ -31,32 +183,53 @@ def create_slideshow(media_files: list[Path], output_path: Path, resolution: str
     # Pula de skip_n em skip_n
     media_files = media_files[::skip_n]
 
-    for f in tqdm(media_files, desc="Processando arquivos"):
-        ext = f.suffix.lower()
-
-        if ext in ['.jpg', '.jpeg', '.png', '.heic']:
-            img = ImageClip(str(f)).set_duration(image_duration)
-            img = img.resize(height=height)
-            gps = extract_gps_from_image(f)
-            if gps:
+    # Diretório de trabalho da execução (mapas, frames e segmentos)
+    cache_dir = Path(tempfile.mkdtemp(prefix="geojourney_"))
+    try:
+        # Renderiza todos os mapas antes, em paralelo (download de tiles é IO-bound)
+        image_files = [f for f in media_files if f.suffix.lower() in IMAGE_EXTENSIONS]
+        if gps_by_path is not None:
+            gps_points = [(f, gps_by_path.get(f)) for f in image_files]
+        else:
+            # Todas as fotos numa única chamada ao exiftool
+            gps_points = list(zip(image_files, extract_gps_from_image(image_files)))
+        map_paths = {}
+        with ThreadPoolExecutor(max_workers=MAP_WORKERS) as ex:
+            futures = []
+            for i, (f, gps) in enumerate(gps_points):
+                if not gps:
+                    continue
                 lat, lon = gps
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    map_path = Path(tmpdir) / (f.stem + '_map.png')
-                    generate_map_image(lat, lon, map_path, size=(200, 200))
-                    map_clip = ImageClip(str(map_path)).set_duration(image_duration)
-                    # Coloca o mapa no canto inferior direito
-                    map_clip = map_clip.set_position((img.w - 210, img.h - 210))  # 10px padding
-                    img = CompositeVideoClip([img, map_clip], size=(img.w, img.h))
-            clips.append(img)
-
-        elif ext in ['.mp4', '.mov', '.mkv']:
-            video = VideoFileClip(str(f)).resize(height=height)
-            clips.append(video)
-
-    if not clips:
-        print("No media to compose.")
-        return
-
-    final_clip = concatenate_videoclips(clips, method="compose")
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    final_clip.write_videofile(str(output_path), fps=24)
+                map_paths[f] = cache_dir / f"{i:05d}_{f.stem}_map.png"
+                futures.append(ex.submit(generate_map_image, lat, lon, map_paths[f], size=MAP_SIZE))
+            for future in tqdm(futures, desc="Gerando mapas"):
+                future.result()
+
+        # Cada arquivo vira um segmento MP4 (codificados em paralelo pelo ffmpeg)
+        segments = []
+        workers = ENCODE_WORKERS if encoder == "libx264" else HW_ENCODE_WORKERS
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = []
+            for i, f in enumerate(media_files):
+                ext = f.suffix.lower()
+                segment = cache_dir / f"{i:05d}_segment.mp4"
+
+                if ext in IMAGE_EXTENSIONS:
+                    frame = prepare_image(f, cache_dir / f"{i:05d}_{f.stem}.jpg", width, height, map_paths.get(f))
+                    futures.append(ex.submit(encode_image_segment, frame, segment, image_duration, encoder))
+                elif ext in VIDEO_EXTENSIONS:
+                    futures.append(ex.submit(encode_video_segment, f, segment, width, height, encoder))
+                else:
+                    continue
+                segments.append(segment)
+            for future in tqdm(futures, desc="Processando arquivos"):
+                future.result()
+
+        if not segments:
+            print("No media to compose.")
+            return
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        concat_segments(segments, cache_dir / "concat.txt", output_path)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
@@ -1,33 +1,36 @@
 from pathlib import Path
-from typing import List
-from exiftool import ExifToolHelper
+from typing import Dict, Tuple
+from utils.exif import BATCH_SIZE, get_et
+from utils.geo_utils import GPS_TAGS, gps_from_metadata
 from tqdm import tqdm
 
 SUPPORTED_EXTENSIONS = {'.heic', '.jpg', '.jpeg', '.mov', '.mp4'}
 
-def list_media_with_gps(input_dir: Path) -> List[Path]:
+
+def list_media_with_gps(input_dir: Path) -> Dict[Path, Tuple[float, float]]:
     """
-    Returns a list of media files that contain GPS metadata.
-    Progress is shown as each file is processed.
+    Returns a dict {media file: (latitude, longitude)} of the files that contain GPS metadata.
+    Metadata is read in batches of BATCH_SIZE files per exiftool call,
+    restricted to the GPS tags. Progress is shown per batch.
     """
-    files_with_gps = []
+    files_with_gps = {}
     all_files = [f for f in input_dir.rglob("*") if f.suffix.lower() in SUPPORTED_EXTENSIONS]
 
     if not all_files:
-        return []
-
-    with ExifToolHelper() as et:
-        for f in tqdm(all_files, desc="Reading metadata"):
-            metadata = et.get_metadata(str(f))
-            if not metadata:
-                continue
-
-            item = metadata[0]
-            source_file = item.get("SourceFile")
-            gps_lat = item.get("EXIF:GPSLatitude") or item.get("QuickTime:GPSLatitude")
-            gps_lon = item.get("EXIF:GPSLongitude") or item.get("QuickTime:GPSLongitude")
+        return {}
 
-            if gps_lat and gps_lon and source_file:
-                files_with_gps.append(Path(source_file))
+    batches = [all_files[i:i + BATCH_SIZE] for i in range(0, len(all_files), BATCH_SIZE)]
+    et = get_et()
+    with tqdm(total=len(all_files), desc="Reading metadata") as bar:
+        for batch in batches:
+            # -fast e não -fast2: o -fast2 para no átomo mdat e perde o GPS de
+            # MP4/MOV com o moov no fim do arquivo
+            metadata_list = et.get_tags([str(f) for f in batch], tags=GPS_TAGS, params=["-n", "-fast"])
+            for item in metadata_list or []:
+                source_file = item.get("SourceFile")
+                gps = gps_from_metadata(item)
+                if gps and source_file:
+                    files_with_gps[Path(source_file)] = gps
+            bar.update(len(batch))
 
     return files_with_gps
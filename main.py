@@ -1,7 +1,7 @@
 import argparse
 from pathlib import Path
 from ingest.media_importer import list_media_with_gps  # ajuste o caminho conforme sua estrutura
-from composer.slideshow_creator import create_slideshow
+from composer.slideshow_creator import create_slideshow, ENCODER_PARAMS
 
 import pillow_heif
 pillow_heif.register_heif_opener()
@@ -33,6 +33,12 @@ def parse_args():
         default=1,
         help="Processa apenas de N em N arquivos para acelerar (default=5)"
     )
+    parser.add_argument(
+        "--encoder",
+        choices=["auto", *ENCODER_PARAMS],
+        default="auto",
+        help="H.264 encoder used by ffmpeg (default: auto, prefers hardware encoders)"
+    )
     return parser.parse_args()
 
 def main():
@@ -41,9 +47,10 @@ def main():
     print(f"Output folder: {args.output}")
     print(f"Resolution: {args.resolution}")
 
-    media_files = list_media_with_gps(args.input)
-    print(f"Found {len(media_files)} media files with GPS data:")
+    gps_by_path = list_media_with_gps(args.input)
+    print(f"Found {len(gps_by_path)} media files with GPS data:")
     output_video = args.output / "geojourney_preview.mp4"
-    create_slideshow(media_files, output_video, resolution=args.resolution, skip_n=args.skip_n)
+    create_slideshow(list(gps_by_path), output_video, resolution=args.resolution, skip_n=args.skip_n,
+                     encoder=args.encoder, gps_by_path=gps_by_path)
 if __name__ == "__main__":
     main()
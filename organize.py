@@ -9,9 +9,14 @@ def main():
     DEFAULT_INPUT = "/home/munif/.tx/in"
     DEFAULT_OUTPUT = "/home/munif/.tx/out"
 
-    if len(sys.argv) == 3:
-        input_folder = sys.argv[1]
-        output_folder = sys.argv[2]
+    # --content-hash: nomeia as fotos pelo hash dos bytes (mais rápido, sem
+    # detectar a mesma foto recodificada) em vez do pHash
+    args = [a for a in sys.argv[1:] if a != "--content-hash"]
+    perceptual = len(args) == len(sys.argv) - 1
+
+    if len(args) == 2:
+        input_folder = args[0]
+        output_folder = args[1]
     else:
         print(f"[INFO] Using default folders: {DEFAULT_INPUT} -> {DEFAULT_OUTPUT}")
         input_folder = DEFAULT_INPUT
@@ -20,7 +25,7 @@ def main():
    
 
     print("--- Organizing PHOTOS ---")
-    organize_photos(input_folder, output_folder)
+    organize_photos(input_folder, output_folder, perceptual=perceptual)
 
     print("--- Organizing VIDEOS ---")
     organize_videos(input_folder, output_folder)
@@ -1,23 +1,121 @@
 import os
 from pathlib import Path
-import shutil
+import hashlib
+import sqlite3
+import json
 from PIL import Image
-import imagehash
-import exiftool
+import numpy as np
 from datetime import datetime
+from multiprocessing import Pool
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import pillow_heif
+from utils.file_utils import MOVE_WORKERS, fast_move
+from utils.exif import BATCH_SIZE as METADATA_BATCH_SIZE, get_et
 pillow_heif.register_heif_opener()
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 SUPPORTED_EXTENSIONS = {
     '.jpg', '.jpeg', '.heic', '.png', '.bmp', '.gif', '.tiff', '.tif', '.webp', '.avif', '.jfif',
     '.ppm', '.pnm', '.pbm', '.pgm', '.tga', '.ico', '.ras', '.cr2', '.thm'  # Canon RAW e thumbnail
 }
 
+# Leitura em blocos de 1 MiB para o hash de conteúdo
+HASH_CHUNK_SIZE = 1 << 20
+
+# Cache (path, size, mtime) -> hash / metadados, criado dentro da pasta de saída
+CACHE_DB_NAME = ".organize_cache.db"
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exif (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    meta BLOB NOT NULL,
+    PRIMARY KEY (path, size, mtime)
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (path, size, mtime, kind)
+);
+"""
+
+def generate_content_hash(file_path):
+    """
+    Gera o token de hash a partir dos bytes do arquivo (blake2b de 64 bits,
+    16 caracteres hex como o pHash), lendo em blocos sem decodificar a imagem.
+    Antes valida o arquivo com Image.verify() (só a estrutura, sem decodificar
+    os pixels): arquivo corrompido ou que não é imagem retorna None e vai para
+    errors/, como no pHash.
+    """
+    try:
+        with Image.open(file_path) as img:
+            img.verify()
+        h = hashlib.blake2b(digest_size=8)
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                h.update(chunk)
+        return h.hexdigest()
+    except Exception as e:
+        print(f"[ERROR] Failed to generate hash for {file_path}: {e}")
+        return None
+
+# pHash: DCT-II 32x32 (como scipy.fftpack.dct, sem normalização), só as 8x8 frequências baixas
+PHASH_SIZE = 8
+PHASH_IMG_SIZE = 32
+_n = np.arange(PHASH_IMG_SIZE)
+_DCT_LOW = 2.0 * np.cos(np.pi * np.arange(PHASH_SIZE)[:, None] * (2 * _n[None, :] + 1) / (2 * PHASH_IMG_SIZE))
+
+def _dct_low_numpy(pixels, basis):
+    return basis @ pixels @ basis.T
+
+def _dct_low_loops(pixels, basis):
+    # Duas passadas de DCT 1D (colunas e depois linhas), calculando só o bloco 8x8
+    k_size, n_size = basis.shape
+    tmp = np.zeros((k_size, n_size))
+    for k in range(k_size):
+        for m in range(n_size):
+            b = basis[k, m]
+            for n in range(n_size):
+                tmp[k, n] += b * pixels[m, n]
+    out = np.zeros((k_size, k_size))
+    for k in range(k_size):
+        for l in range(k_size):
+            acc = 0.0
+            for n in range(n_size):
+                acc += tmp[k, n] * basis[l, n]
+            out[k, l] = acc
+    return out
+
+# Com numba o kernel é compilado (e cacheado em disco); sem ele, usa a forma matricial do numpy
+_dct_low = njit(cache=True)(_dct_low_loops) if njit is not None else _dct_low_numpy
+
 def generate_image_hash(image_path):
+    """
+    Hash perceptual (pHash) da imagem decodificada. Mais caro que o hash de
+    conteúdo, mas agrupa a mesma foto salva com codificações diferentes.
+    Fora JPEG, produz o mesmo valor que imagehash.phash. Em JPEG a
+    decodificação reduzida (draft) pode mudar alguns bits (2 de 64 em cerca de
+    1 a cada 4 imagens de teste).
+    """
     try:
         with Image.open(image_path) as img:
-            img_hash = imagehash.phash(img.resize((256, 256)).convert("L"))
-            return str(img_hash)
+            # Para JPEG, decodifica já em escala reduzida (>= 256x256) e em tons de cinza;
+            # nos demais formatos draft() não faz nada
+            img.draft('L', (256, 256))
+            small = img.resize((256, 256)).convert("L").resize((PHASH_IMG_SIZE, PHASH_IMG_SIZE), Image.LANCZOS)
+            pixels = np.ascontiguousarray(np.asarray(small, dtype=np.float64))
+            dct = _dct_low(pixels, _DCT_LOW)
+            bits = (dct > np.median(dct)).flatten()
+            return f"{int(''.join('1' if b else '0' for b in bits), 2):0{PHASH_SIZE * PHASH_SIZE // 4}x}"
     except Exception as e:
         print(f"[ERROR] Failed to generate hash for {image_path}: {e}")
         return None
@@ -49,7 +147,196 @@ def extract_date(metadata):
                 continue
     return None, 0
 
-def organize_photos(source_folder, output_folder):
+def stat_keys(files):
+    """Chaves de cache (path, size, mtime_ns) alinhadas com files; None se o stat falhar."""
+    keys = []
+    for f in files:
+        try:
+            st = f.stat()
+            keys.append((str(f), st.st_size, st.st_mtime_ns))
+        except OSError:
+            keys.append(None)
+    return keys
+
+def read_metadata(files, keys, cache):
+    """
+    Lê os metadados de todos os arquivos. Arquivos com (path, size, mtime) já no
+    cache não passam pelo exiftool; os demais são lidos em lotes de
+    METADATA_BATCH_SIZE pelo exiftool compartilhado (utils.exif) e gravados no cache.
+    Retorna dict {caminho (str): metadados}; arquivos ilegíveis ficam de fora.
+    """
+    metadata_by_path = {}
+    missing = []
+    for f, key in zip(files, keys):
+        row = None
+        if key is not None:
+            row = cache.execute("SELECT meta FROM exif WHERE path = ? AND size = ? AND mtime = ?", key).fetchone()
+        if row:
+            metadata_by_path[str(f)] = json.loads(row[0])
+        else:
+            missing.append(f)
+    print(f"[INFO] {len(files) - len(missing)} metadata from cache, {len(missing)} to read.")
+
+    if not missing:
+        return metadata_by_path
+
+    keys_by_path = {key[0]: key for key in keys if key is not None}
+    et = get_et()
+    for i in range(0, len(missing), METADATA_BATCH_SIZE):
+        batch = missing[i:i + METADATA_BATCH_SIZE]
+        try:
+            new_rows = []
+            for item in et.get_metadata([str(f) for f in batch]) or []:
+                source = item.get('SourceFile')
+                metadata_by_path[source] = item
+                if source in keys_by_path:
+                    new_rows.append((*keys_by_path[source], json.dumps(item)))
+            with cache:
+                cache.executemany("INSERT OR REPLACE INTO exif (path, size, mtime, meta) VALUES (?, ?, ?, ?)", new_rows)
+        except Exception as e:
+            print(f"[ERROR] Could not read metadata batch: {e}")
+    return metadata_by_path
+
+def open_cache(output):
+    output.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(output / CACHE_DB_NAME))
+    conn.executescript(CACHE_SCHEMA)
+    return conn
+
+def compute_hashes(files, keys, cache, perceptual=True):
+    """
+    Retorna a lista de hashes alinhada com files. Consulta o cache por
+    (path, size, mtime) e só calcula (em paralelo) os que faltam.
+    """
+    # "content": hashes gravados só depois de validar a imagem (o antigo
+    # "blake2b" podia conter arquivos corrompidos)
+    kind = "phash" if perceptual else "content"
+    hash_fn = generate_image_hash if perceptual else generate_content_hash
+
+    hashes = [None] * len(files)
+    missing = []
+    for i, key in enumerate(keys):
+        row = None
+        if key is not None:
+            row = cache.execute(
+                "SELECT hash FROM hashes WHERE path = ? AND size = ? AND mtime = ? AND kind = ?",
+                (*key, kind)).fetchone()
+        if row:
+            hashes[i] = row[0]
+        else:
+            missing.append(i)
+
+    print(f"[INFO] {len(files) - len(missing)} hashes from cache, {len(missing)} to compute.")
+    if missing:
+        with Pool() as pool:
+            computed = pool.map(hash_fn, [files[i] for i in missing], chunksize=16)
+        new_rows = []
+        for i, h in zip(missing, computed):
+            hashes[i] = h
+            if h and keys[i] is not None:
+                new_rows.append((*keys[i], kind, h))
+        with cache:
+            cache.executemany("INSERT OR REPLACE INTO hashes (path, size, mtime, kind, hash) VALUES (?, ?, ?, ?, ?)", new_rows)
+    return hashes
+
+def place_photo(idx, total, file_path, image_hash, metadata, output, lock_for):
+    """
+    Move uma foto para o destino final (ou para errors/), tratando colisões de nome.
+    Executa em thread: a verificação de colisão e a movimentação ocorrem sob o lock
+    da pasta de destino. Retorna a lista de contadores a incrementar.
+    As mensagens da foto são impressas juntas no fim, para não se misturarem
+    com as das outras threads.
+    """
+    log = [f"[{idx}/{total}] Analyzing: {file_path.name}"]
+    result = []
+    try:
+        if metadata is None:
+            log.append("  [ERROR] Could not read metadata")
+            return ["metadata_error"]
+
+        photo_date, ms = extract_date(metadata)
+        used_exif = True
+        if not photo_date:
+            # Tenta data de modificação do arquivo
+            stat = file_path.stat()
+            dt_file = datetime.fromtimestamp(stat.st_mtime)
+            ms = int((stat.st_mtime - int(stat.st_mtime)) * 1000)
+            photo_date = dt_file
+            used_exif = False
+
+        if not image_hash:
+            msg = f"  [SKIPPED] Could not generate hash."
+            log.append(msg)
+            # Move para pasta errors
+            errors_folder = output / "errors"
+            errors_folder.mkdir(parents=True, exist_ok=True)
+            error_target = errors_folder / file_path.name
+            try:
+                with lock_for(errors_folder):
+                    fast_move(file_path, error_target)
+                log.append(f"  [MOVED TO ERRORS] {file_path} -> {error_target}")
+            except Exception as e:
+                log.append(f"  [ERROR] Could not move to errors: {e}")
+            return ["no_hash"]
+
+        if used_exif:
+            target_folder = output / "date"/str(photo_date.year) / f"{photo_date.month:02d}" / f"{photo_date.day:02d}"
+        else:
+            target_folder = output / "no-date" / str(photo_date.year) / f"{photo_date.month:02d}" / f"{photo_date.day:02d}"
+        target_folder.mkdir(parents=True, exist_ok=True)
+
+        ext = file_path.suffix.lower()
+        timestamp_s = int(photo_date.timestamp())
+        target_file = target_folder / f"{timestamp_s}{ms:03d}-{image_hash}{ext}"
+
+        with lock_for(target_folder):
+            if not target_file.exists():
+                fast_move(file_path, target_file)
+                result.append("moved")
+                msg = f"  [MOVED{' - NO EXIF' if not used_exif else ''}] {file_path} -> {target_file}"
+                log.append(msg)
+            else:
+                # Arquivo já existe, comparar tamanhos
+                src_size = file_path.stat().st_size
+                dst_size = target_file.stat().st_size
+                if src_size > dst_size:
+                    target_file.unlink()
+                    fast_move(file_path, target_file)
+                    result.append("replaced")
+                    msg = f"  [REPLACED] {file_path} (larger) replaced and moved to: {target_file}"
+                    log.append(msg)
+                elif src_size < dst_size:
+                    file_path.unlink()
+                    result.append("removed_src")
+                    msg = f"  [REMOVED] {file_path} (smaller) removed, kept destination: {target_file}"
+                    log.append(msg)
+                elif src_size == dst_size:
+                    file_path.unlink()
+                    result.append("removed_src")
+                    msg = f"  [REMOVED] {file_path} (duplicate same size), kept destination: {target_file}"
+                    log.append(msg)
+                else:
+                    msg = f"  [DUPLICATE] Already exists."
+                    result.append("duplicate")
+                    log.append(msg)
+
+        if not used_exif:
+            result.append("no_exif")
+        return result
+    except Exception as e:
+        msg = f"  [ERROR] Unexpected error processing {file_path}: {e}"
+        log.append(msg)
+        return result + ["unexpected_error"]
+    finally:
+        print("\n".join(log), flush=True)
+
+def organize_photos(source_folder, output_folder, perceptual=True):
+    """
+    Organiza as fotos por data. O nome final inclui o pHash (ou, com
+    perceptual=False, o hash dos bytes do arquivo) usado depois por
+    remove_duplicates. Os dois tokens não se misturam: fotos organizadas com
+    um não são reconhecidas como duplicadas das importadas com o outro.
+    """
     source = Path(source_folder)
     output = Path(output_folder)
 
@@ -58,111 +345,46 @@ def organize_photos(source_folder, output_folder):
     total_files = len(files)
     print(f"[INFO] {total_files} total files found.\n")
 
-    analyzed = 0
-    moved = 0
-    replaced = 0
-    removed_src = 0
-    skipped_no_exif = 0
-    skipped_no_hash = 0
-    skipped_duplicate = 0
-    skipped_metadata_error = 0
-    skipped_unexpected_error = 0
-
-    import json
-    import sys
-    from datetime import datetime as dt
-    import os
-
-    with exiftool.ExifTool() as et:
-        for idx, file_path in enumerate(files, start=1):
-            if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
-                continue
-            print(f"[{idx}/{total_files}] Analyzing: {file_path.name}")
-            analyzed += 1
-            try:
-                try:
-                    metadata_bytes = et.execute('-j', str(file_path))  # '-j' outputs JSON
-                    metadata_list = json.loads(metadata_bytes)
-                    metadata = metadata_list[0] if metadata_list else {}
-                except Exception as e:
-                    msg = f"  [ERROR] Could not read metadata: {e}"
-                    print(msg)
-                    skipped_metadata_error += 1
-                    continue
-
-                photo_date, ms = extract_date(metadata)
-                used_exif = True
-                if not photo_date:
-                    # Tenta data de modificação do arquivo
-                    stat = file_path.stat()
-                    dt_file = datetime.fromtimestamp(stat.st_mtime)
-                    ms = int((stat.st_mtime - int(stat.st_mtime)) * 1000)
-                    photo_date = dt_file
-                    used_exif = False
-
-                image_hash = generate_image_hash(file_path)
-                if not image_hash:
-                    msg = f"  [SKIPPED] Could not generate hash."
-                    print(msg)
-                    # Move para pasta errors
-                    errors_folder = output / "errors"
-                    errors_folder.mkdir(parents=True, exist_ok=True)
-                    error_target = errors_folder / file_path.name
-                    try:
-                        shutil.move(str(file_path), str(error_target))
-                        print(f"  [MOVED TO ERRORS] {file_path} -> {error_target}")
-                    except Exception as e:
-                        print(f"  [ERROR] Could not move to errors: {e}")
-                    skipped_no_hash += 1
-                    continue
-
-                if used_exif:
-                    target_folder = output / "date"/str(photo_date.year) / f"{photo_date.month:02d}" / f"{photo_date.day:02d}"
-                else:
-                    target_folder = output / "no-date" / str(photo_date.year) / f"{photo_date.month:02d}" / f"{photo_date.day:02d}"
-                target_folder.mkdir(parents=True, exist_ok=True)
-
-                ext = file_path.suffix.lower()
-                timestamp_s = int(photo_date.timestamp())
-                target_file = target_folder / f"{timestamp_s}{ms:03d}-{image_hash}{ext}"
-
-                if not target_file.exists():
-                    shutil.move(str(file_path), str(target_file))
-                    moved += 1
-                    msg = f"  [MOVED{' - NO EXIF' if not used_exif else ''}] {file_path} -> {target_file}"
-                    print(msg)
-                else:
-                    # Arquivo já existe, comparar tamanhos
-                    src_size = file_path.stat().st_size
-                    dst_size = target_file.stat().st_size
-                    if src_size > dst_size:
-                        target_file.unlink()
-                        shutil.move(str(file_path), str(target_file))
-                        replaced += 1
-                        msg = f"  [REPLACED] {file_path} (larger) replaced and moved to: {target_file}"
-                        print(msg)
-                    elif src_size < dst_size:
-                        file_path.unlink()
-                        removed_src += 1
-                        msg = f"  [REMOVED] {file_path} (smaller) removed, kept destination: {target_file}"
-                        print(msg)
-                    elif src_size == dst_size:
-                        file_path.unlink()
-                        removed_src += 1
-                        msg = f"  [REMOVED] {file_path} (duplicate same size), kept destination: {target_file}"
-                        print(msg)
-                    else:
-                        msg = f"  [DUPLICATE] Already exists."
-                        skipped_duplicate += 1
-                        print(msg)
-
-                if not used_exif:
-                    skipped_no_exif += 1
-            except Exception as e:
-                msg = f"  [ERROR] Unexpected error processing {file_path}: {e}"
-                print(msg)
-                skipped_unexpected_error += 1
-                continue
+    photos = [f for f in files if f.suffix.lower() in SUPPORTED_EXTENSIONS]
+    print(f"[INFO] {len(photos)} photos to analyze. Reading metadata...")
+    keys = stat_keys(photos)
+    cache = open_cache(output)
+    try:
+        metadata_by_path = read_metadata(photos, keys, cache)
+
+        # Hash é CPU/IO-bound: distribui entre os núcleos
+        print(f"[INFO] Generating hashes with {os.cpu_count()} processes...")
+        hashes = compute_hashes(photos, keys, cache, perceptual)
+    finally:
+        cache.close()
+
+    # Movimentações em paralelo; ações com a mesma pasta de destino são serializadas
+    locks = defaultdict(threading.Lock)
+    locks_guard = threading.Lock()
+
+    def lock_for(folder):
+        with locks_guard:
+            return locks[folder]
+
+    counts = Counter()
+    total = len(photos)
+    with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as ex:
+        jobs = [
+            ex.submit(place_photo, idx, total, file_path, image_hash, metadata_by_path.get(str(file_path)), output, lock_for)
+            for idx, (file_path, image_hash) in enumerate(zip(photos, hashes), start=1)
+        ]
+        for job in jobs:
+            counts.update(job.result())
+
+    analyzed = len(photos)
+    moved = counts["moved"]
+    replaced = counts["replaced"]
+    removed_src = counts["removed_src"]
+    skipped_no_exif = counts["no_exif"]
+    skipped_no_hash = counts["no_hash"]
+    skipped_duplicate = counts["duplicate"]
+    skipped_metadata_error = counts["metadata_error"]
+    skipped_unexpected_error = counts["unexpected_error"]
 
     print("\n[FINISHED]")
     print(f"Total analyzed files: {analyzed}")
@@ -3,9 +3,10 @@ import sqlite3
 DB_PATH = "media_scan.sqlite"
 
 SQL = """
-SELECT label, COUNT(*) AS qtd
-FROM detections
-GROUP BY label
+SELECT l.name AS label, COUNT(*) AS qtd
+FROM detections d
+LEFT JOIN labels l ON l.id = d.label_id
+GROUP BY l.name
 ORDER BY qtd DESC
 LIMIT 10;
 """
@@ -13,9 +14,10 @@ PARAMS = {}
 
 
 SQL = """
-SELECT m.path, m.type, d.frame_time, d.box_x1, d.box_y1, d.box_x2, d.box_y2, d.score, d.label
+SELECT m.path, m.type, d.frame_time, d.box_x1, d.box_y1, d.box_x2, d.box_y2, d.score, l.name AS label
 FROM detections d
 JOIN media m ON m.id = d.media_id
+LEFT JOIN labels l ON l.id = d.label_id
 WHERE d.score >= :minscore
 AND 
 
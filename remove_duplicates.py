@@ -5,40 +5,33 @@ Keeps the oldest file (smallest date) and moves the most recent ones to duplicat
 """
 
 import os
-import shutil
+import re
 from pathlib import Path
 from datetime import datetime
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from tqdm import tqdm
+from utils.file_utils import MOVE_WORKERS, fast_move, walk_files
 
 
-def extract_hash_from_filename(filename):
-    """
-    Extracts the hash from the filename, assuming format: <timestamp>_<hash>.<ext> or <timestamp>-<hash>.<ext>
-    """
-    name = Path(filename).stem
-    if '_' in name:
-        parts = name.split('_', 1)
-    elif '-' in name:
-        parts = name.split('-', 1)
-    else:
-        parts = [name]
-    if len(parts) == 2:
-        return parts[1]
-    return None
+# <timestamp>_<hash> ou <timestamp>-<hash>; "_" tem prioridade sobre "-"
+_NAME_RE = re.compile(r'^([^_]*)_(.*)$|^([^-]*)-(.*)$', re.DOTALL)
 
-def extract_timestamp_from_filename(filename):
+def parse_filename(filename):
     """
-    Extracts the timestamp from the filename, assuming format: <timestamp>_<hash>.<ext> or <timestamp>-<hash>.<ext>
+    Extracts (timestamp, hash) from the filename in a single pass, assuming format:
+    <timestamp>_<hash>.<ext> or <timestamp>-<hash>.<ext>. Returns (None, None) otherwise.
     """
-    name = Path(filename).stem
-    if '_' in name:
-        parts = name.split('_', 1)
-    elif '-' in name:
-        parts = name.split('-', 1)
-    else:
-        parts = [name]
-    if len(parts) == 2:
-        return parts[0]
-    return None
+    # Mesmo resultado de Path(filename).stem, sem criar um Path
+    dot = filename.rfind('.')
+    stem = filename[:dot] if 0 < dot < len(filename) - 1 else filename
+    m = _NAME_RE.match(stem)
+    if not m:
+        return None, None
+    if m.group(1) is not None:
+        return m.group(1), m.group(2)
+    return m.group(3), m.group(4)
 
 def remove_duplicate_files(root_folder, duplicated_folder):
     """
@@ -46,46 +39,73 @@ def remove_duplicate_files(root_folder, duplicated_folder):
     keeps the oldest (smallest timestamp) and moves the others to <duplicated_folder>/<hash>/
     """
     print(f"[START] Recursive scan in: {root_folder}")
-    files_by_hash = {}
     root = Path(root_folder)
     duplicated_base = Path(duplicated_folder)
-    all_files = list(root.rglob('*'))
+    # Estrutura em colunas (SoA): um índice por arquivo em cada coluna.
+    # O hash vira um código inteiro (índice em hash_names) para agrupar com numpy.
+    paths = []
+    timestamps = []
+    hash_codes = array('q')
+    sizes = array('q')
+    hash_names = []
+    code_by_hash = {}
     file_count = 0
-    for file in all_files:
-        if file.is_file():
-            file_count += 1
-            hash_part = extract_hash_from_filename(file.name)
-            timestamp = extract_timestamp_from_filename(file.name)
-            if not hash_part or not timestamp:
-                continue
-            size = file.stat().st_size
-            key = (hash_part, size)
-            files_by_hash.setdefault(key, []).append((file, timestamp))
+    # Uma única passada em streaming: não lista a árvore antes
+    for entry in walk_files(root):
+        file_count += 1
+        timestamp, hash_part = parse_filename(entry.name)
+        if not hash_part or not timestamp:
+            continue
+        code = code_by_hash.get(hash_part)
+        if code is None:
+            code = code_by_hash[hash_part] = len(hash_names)
+            hash_names.append(hash_part)
+        paths.append(entry.path)
+        timestamps.append(timestamp)
+        hash_codes.append(code)
+        sizes.append(entry.stat(follow_symlinks=False).st_size)
+
+    # Agrupa por (hash, tamanho): ordena e marca onde a chave muda
+    codes_np = np.frombuffer(hash_codes, dtype=np.int64) if hash_codes else np.empty(0, np.int64)
+    sizes_np = np.frombuffer(sizes, dtype=np.int64) if sizes else np.empty(0, np.int64)
+    order = np.lexsort((sizes_np, codes_np))
+    sorted_codes = codes_np[order]
+    sorted_sizes = sizes_np[order]
+    boundaries = np.flatnonzero((np.diff(sorted_codes) != 0) | (np.diff(sorted_sizes) != 0)) + 1
+    starts = np.concatenate(([0], boundaries)) if len(order) else boundaries
+    ends = np.concatenate((boundaries, [len(order)])) if len(order) else boundaries
     print(f"[INFO] {file_count} files found.")
-    print(f"[INFO] {len(files_by_hash)} groups (hash+size) identified.")
+    print(f"[INFO] {len(starts)} groups (hash+size) identified.")
 
     duplicated_groups = 0
-    total_moved = 0
     total_kept = 0
-    for (hash_part, size), files in files_by_hash.items():
-        if len(files) <= 1:
+    moves = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if end - start <= 1:
             continue
+        members = order[start:end].tolist()
+        hash_part = hash_names[sorted_codes[start]]
+        size = int(sorted_sizes[start])
         duplicated_groups += 1
-        print(f"\n[GROUP] Hash: {hash_part} | Size: {size} bytes | {len(files)} files")
+        print(f"\n[GROUP] Hash: {hash_part} | Size: {size} bytes | {len(members)} files")
         # Sort by timestamp (smallest = oldest)
-        files_sorted = sorted(files, key=lambda x: x[1])
+        files_sorted = sorted(members, key=lambda i: timestamps[i])
         # Keep the oldest
-        to_keep = files_sorted[0][0]
-        to_move = [f[0] for f in files_sorted[1:]]
+        to_keep = Path(paths[files_sorted[0]])
+        to_move = [Path(paths[i]) for i in files_sorted[1:]]
         duplicated_dir = duplicated_base / hash_part
         duplicated_dir.mkdir(parents=True, exist_ok=True)
         for f in to_move:
             target = duplicated_dir / f.name
             print(f"  [MOVE] {f} -> {target}")
-            shutil.move(str(f), str(target))
-            total_moved += 1
+            moves.append((f, target))
         print(f"  [KEEP] {to_keep}")
         total_kept += 1
+
+    # As pastas de destino já existem: os renames são independentes e rodam em paralelo
+    with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as ex:
+        list(tqdm(ex.map(lambda pair: fast_move(*pair), moves), total=len(moves), desc="Moving duplicates"))
+    total_moved = len(moves)
     print(f"\n[SUMMARY] {duplicated_groups} duplicate groups processed.")
     print(f"[SUMMARY] {total_kept} files kept, {total_moved} files moved to {duplicated_base}/<hash>/.")
     print("[FINISHED] Operation completed.")
@@ -12,8 +12,9 @@ Atende aos requisitos:
 - Suporte a **lista de labels ignoradas** (default inclui "FEET_COVERED")
 
 Requisitos:
-    pip install nudenet opencv-python
+    pip install nudenet opencv-python pillow
     # Instale também TensorFlow (CPU ou GPU) conforme sua máquina.
+    # Opcional: pip install ffmpegcv  (decode de vídeo na GPU/NVDEC)
 
 Uso:
     # Sem argumentos -> usa 'scan' com defaults
@@ -33,16 +34,23 @@ Uso:
 """
 
 import argparse
+import atexit
 import hashlib
+import mmap
+import multiprocessing
 import os
 import sqlite3
 import sys
 import time
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from typing import Iterable, List, Optional, Tuple
 
+from utils.file_utils import generate_file_hash, walk_files
+
 # -------------------------------
 # Configurações básicas
 # -------------------------------
@@ -74,19 +82,105 @@ try:
 except Exception:
     NudeDetector = None
 
+try:
+    # Pré/pós-processamento internos do NudeDetector (nudenet 3.x), usados para
+    # rodar a sessão ONNX direto sobre arrays em memória
+    from nudenet.nudenet import _read_image as _nn_read_image, _postprocess as _nn_postprocess
+except Exception:
+    _nn_read_image = _nn_postprocess = None
+
 try:
     import cv2
 except Exception:
     cv2 = None
 
+try:
+    # Decode de vídeo na GPU (NVDEC) via ffmpeg; opcional
+    import ffmpegcv
+except Exception:
+    ffmpegcv = None
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+# Detecções de uma mídia num único array estruturado (uma linha por detecção);
+# frame_time é NaN para imagens e vira NULL no banco
+DET_DTYPE = np.dtype([
+    ("frame_time", "f8"),
+    ("x1", "i4"), ("y1", "i4"), ("x2", "i4"), ("y2", "i4"),
+    ("score", "f8"),  # f4 arredondaria os scores (0.7 -> 0.699999988)
+    ("label_id", "i2"),
+]) if np is not None else None
+
+# Rótulos normalizados indexados por label_id. Começa pela lista fixa do
+# NudeNet, então os ids são os mesmos em todos os processos; rótulos
+# desconhecidos entram no fim.
+try:
+    import nudenet.nudenet as _nn_module
+    LABELS: List[str] = [str(name).upper() for name in getattr(_nn_module, "__labels", ())]
+except Exception:
+    LABELS = []
+_LABEL_IDS = {name: i for i, name in enumerate(LABELS)}
+
+
+def label_id(name: str) -> int:
+    lid = _LABEL_IDS.get(name)
+    if lid is None:
+        lid = _LABEL_IDS[name] = len(LABELS)
+        LABELS.append(name)
+    return lid
+
+
+# Imagens/frames por execução do modelo quando há GPU
+GPU_BATCH_SIZE = 16
+
+# Cache dos engines TensorRT (a primeira construção leva alguns minutos)
+TRT_CACHE_DIR = Path.home() / ".cache" / "geojourney" / "trt"
+# Modelos ONNX convertidos (FP16)
+MODEL_CACHE_DIR = Path.home() / ".cache" / "geojourney" / "models"
+
 
 # -------------------------------
 # Utilitários
 # -------------------------------
 
+# Threads de leitura/hash/decode e quantos arquivos podem ficar prontos à frente
+# do detector. Das imagens só fica a entrada do modelo (~1,2 MB cada, ver
+# prepare_media), não a imagem decodificada em resolução cheia
+IO_WORKERS = 4
+PREFETCH = 8
+# Imagens enviadas ao pool de processos (só em CPU) à frente das já gravadas,
+# por processo
+POOL_BACKLOG = 4
+
+# A partir deste tamanho o arquivo é hasheado via mmap (uma única chamada em C)
+MMAP_MIN_SIZE = 10 * 1024 * 1024
+
+
 def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
-    h = hashlib.sha256()
     with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN_SIZE:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return hashlib.sha256(mm).hexdigest()
+            except (OSError, ValueError, OverflowError):
+                # mmap pode falhar em NFS/SMB, Windows ou 32 bits: cai para leitura normal
+                f.seek(0)
+        if hasattr(hashlib, "file_digest"):  # Python >= 3.11
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         while True:
             chunk = f.read(chunk_size)
             if not chunk:
@@ -95,8 +189,9 @@ def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
     return h.hexdigest()
 
 
-def infer_media_type(path: Path) -> Optional[str]:
-    ext = path.suffix.lower()
+def infer_media_type(path) -> Optional[str]:
+    # Aceita Path ou str (ex.: DirEntry.name), sem criar Path só para pegar a extensão
+    ext = os.path.splitext(path)[1].lower()
     if ext in IMAGE_EXTS:
         return "image"
     if ext in VIDEO_EXTS:
@@ -113,7 +208,6 @@ def human_ts(ts: float) -> str:
 # -------------------------------
 
 SCHEMA = """
-PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS media (
     id INTEGER PRIMARY KEY,
     path TEXT NOT NULL UNIQUE,
@@ -124,7 +218,8 @@ CREATE TABLE IF NOT EXISTS media (
     width INTEGER,
     height INTEGER,
     duration REAL,
-    analyzed_at REAL NOT NULL
+    analyzed_at REAL NOT NULL,
+    content_sig TEXT -- hash amostrado (utils.file_utils.generate_file_hash)
 );
 CREATE TABLE IF NOT EXISTS detections (
     id INTEGER PRIMARY KEY,
@@ -132,30 +227,190 @@ CREATE TABLE IF NOT EXISTS detections (
     frame_time REAL, -- em segundos; NULL para imagens
     box_x1 INTEGER, box_y1 INTEGER, box_x2 INTEGER, box_y2 INTEGER,
     score REAL,
-    label TEXT
+    label_id INTEGER REFERENCES labels(id)
+);
+-- Nome de cada rótulo uma vez só; detections guarda o id
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
 );
 CREATE INDEX IF NOT EXISTS idx_media_type ON media(type);
 CREATE INDEX IF NOT EXISTS idx_det_media ON detections(media_id);
-CREATE INDEX IF NOT EXISTS idx_det_label_score ON detections(label, score);
+-- Cobre o SELECT do comando list (filtro por label/score, ORDER BY score DESC)
+-- sem ler a tabela; substitui os antigos índices por label TEXT
+DROP INDEX IF EXISTS idx_det_label_score;
+DROP INDEX IF EXISTS idx_det_label_score_desc;
+CREATE INDEX IF NOT EXISTS idx_det_label_id_score_desc
+    ON detections(label_id, score DESC, media_id, frame_time, box_x1, box_y1, box_x2, box_y2);
+CREATE INDEX IF NOT EXISTS idx_media_id_type ON media(id, type, path);
+"""
+
+# SQL usado a cada arquivo; texto fixo para reaproveitar o statement já compilado
+SQL_SELECT_MEDIA = "SELECT id, path, sha256, size_bytes, mtime, content_sig FROM media WHERE path = ?"
+SQL_SELECT_MEDIA_ID = "SELECT id FROM media WHERE path = ?"
+SQL_UPSERT_MEDIA = """
+INSERT INTO media (path, sha256, size_bytes, mtime, type, width, height, duration, analyzed_at, content_sig)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET
+    sha256=excluded.sha256,
+    size_bytes=excluded.size_bytes,
+    mtime=excluded.mtime,
+    type=excluded.type,
+    width=excluded.width,
+    height=excluded.height,
+    duration=excluded.duration,
+    analyzed_at=excluded.analyzed_at,
+    content_sig=excluded.content_sig
 """
+# RETURNING (SQLite >= 3.35) devolve o id também no caso de UPDATE
+SQL_UPSERT_MEDIA_RETURNING = SQL_UPSERT_MEDIA + "RETURNING id"
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+SQL_UPDATE_MEDIA_STAT = "UPDATE media SET size_bytes = ?, mtime = ?, content_sig = ? WHERE path = ?"
+SQL_DELETE_DET = "DELETE FROM detections WHERE media_id = ?"
+SQL_INSERT_DET = """
+INSERT INTO detections
+(media_id, frame_time, box_x1, box_y1, box_x2, box_y2, score, label_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_INSERT_LABEL = "INSERT OR IGNORE INTO labels (name) VALUES (?)"
+SQL_SELECT_LABEL_ID = "SELECT id FROM labels WHERE name = ?"
+
+# Bancos antigos guardavam o rótulo como texto em detections.label: a tabela
+# é recriada com label_id (o SCHEMA roda no meio, com a antiga renomeada).
+# Detecções órfãs (media_id sem mídia) não são copiadas: violariam a FK.
+MIGRATE_LABELS_BEGIN = """
+BEGIN IMMEDIATE;
+DROP INDEX IF EXISTS idx_det_media;
+DROP INDEX IF EXISTS idx_det_label_score;
+DROP INDEX IF EXISTS idx_det_label_score_desc;
+ALTER TABLE detections RENAME TO detections_old;
+"""
+MIGRATE_LABELS_END = """
+INSERT OR IGNORE INTO labels (name) SELECT DISTINCT label FROM detections_old WHERE label IS NOT NULL;
+INSERT INTO detections (id, media_id, frame_time, box_x1, box_y1, box_x2, box_y2, score, label_id)
+SELECT d.id, d.media_id, d.frame_time, d.box_x1, d.box_y1, d.box_x2, d.box_y2, d.score, l.id
+FROM detections_old d
+JOIN media m ON m.id = d.media_id
+LEFT JOIN labels l ON l.name = d.label;
+DROP TABLE detections_old;
+COMMIT;
+"""
+
+# Arquivos gravados por transação (um COMMIT a cada lote) durante o scan
+COMMIT_EVERY_FILES = 256
+
+# Ajustes aplicados uma vez na conexão (WAL + fsync só no checkpoint)
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 1073741824",
+    "PRAGMA wal_autocheckpoint = 10000",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA busy_timeout = 5000",
+)
+
 
 @dataclass
 class DB:
     path: Path
+    _conn: Optional[sqlite3.Connection] = field(default=None, init=False, repr=False)
+    # Escritas acumuladas na transação aberta; gravadas por flush()
+    _pending_detections: List[Tuple] = field(default_factory=list, init=False, repr=False)
+    _files_in_txn: int = field(default=0, init=False, repr=False)
+    # Nome do rótulo -> labels.id, e LABELS[label_id] -> labels.id
+    _label_ids: dict = field(default_factory=dict, init=False, repr=False)
+    _label_map: List[int] = field(default_factory=list, init=False, repr=False)
 
     def connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.path)
-        conn.execute("PRAGMA foreign_keys = ON;")
+        # Uma única conexão por DB; isolation_level=None -> transações explícitas (BEGIN/COMMIT)
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, isolation_level=None,
+                                         cached_statements=256, check_same_thread=False)
+            for pragma in CONNECTION_PRAGMAS:
+                self._conn.execute(pragma)
+            # Fecha na saída do processo (checkpoint do WAL) mesmo sem close() explícito
+            atexit.register(self.close)
+        return self._conn
+
+    def _begin(self) -> sqlite3.Connection:
+        # Abre a transação do lote na primeira escrita (IMMEDIATE: lock de escrita já no início)
+        conn = self.connect()
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
         return conn
 
+    def _file_done(self):
+        self._files_in_txn += 1
+        if self._files_in_txn >= COMMIT_EVERY_FILES:
+            self.flush()
+
+    def _detection_rows(self) -> Iterable[Tuple]:
+        # label_id dos arrays é o índice em LABELS (igual em todos os processos);
+        # no banco vale o id da tabela labels
+        for name in LABELS[len(self._label_map):]:
+            self._label_map.append(self.get_or_create_label_id(name))
+        label_map = self._label_map
+        # Arrays DET_DTYPE -> tuplas só agora, uma mídia por vez (tolist() em bloco)
+        for media_id, dets in self._pending_detections:
+            for frame_time, x1, y1, x2, y2, score, lid in dets.tolist():
+                yield (media_id, None if frame_time != frame_time else frame_time,
+                       x1, y1, x2, y2, score, label_map[lid])
+
+    def flush(self):
+        """Insere as detecções pendentes com um único executemany e faz o COMMIT do lote."""
+        if self._conn is None:
+            return
+        if self._pending_detections:
+            self._begin().executemany(SQL_INSERT_DET, self._detection_rows())
+            self._pending_detections.clear()
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._files_in_txn = 0
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
     def ensure_schema(self):
-        with self.connect() as conn:
+        conn = self.connect()
+        det_columns = {r[1] for r in conn.execute("PRAGMA table_info(detections)")}
+        if "label" in det_columns:
+            orphans = conn.execute(
+                "SELECT COUNT(*) FROM detections d LEFT JOIN media m ON m.id = d.media_id WHERE m.id IS NULL"
+            ).fetchone()[0]
+            try:
+                conn.executescript(MIGRATE_LABELS_BEGIN + SCHEMA + MIGRATE_LABELS_END)
+            except sqlite3.Error:
+                # Sem isso a transação ficaria aberta e o close() faria COMMIT
+                # da migração pela metade
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            if orphans:
+                print(f"[WARN] {orphans} detecções sem mídia correspondente descartadas na migração de rótulos",
+                      file=sys.stderr)
+        else:
             conn.executescript(SCHEMA)
+        # Bancos criados antes da coluna content_sig
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(media)")}
+        if "content_sig" not in columns:
+            conn.execute("ALTER TABLE media ADD COLUMN content_sig TEXT")
+
+    def get_or_create_label_id(self, name: str) -> int:
+        lid = self._label_ids.get(name)
+        if lid is None:
+            conn = self.connect()
+            conn.execute(SQL_INSERT_LABEL, (name,))
+            lid = self._label_ids[name] = conn.execute(SQL_SELECT_LABEL_ID, (name,)).fetchone()[0]
+        return lid
 
     def get_media_by_path(self, path: Path) -> Optional[Tuple]:
-        with self.connect() as conn:
-            cur = conn.execute("SELECT * FROM media WHERE path = ?", (str(path),))
-            return cur.fetchone()
+        cur = self.connect().execute(SQL_SELECT_MEDIA, (str(path),))
+        return cur.fetchone()
 
     def upsert_media(
         self,
@@ -167,48 +422,34 @@ class DB:
         width: Optional[int],
         height: Optional[int],
         duration: Optional[float],
+        content_sig: Optional[str] = None,
     ) -> int:
-        with self.connect() as conn:
-            cur = conn.execute(
-                """
-                INSERT INTO media (path, sha256, size_bytes, mtime, type, width, height, duration, analyzed_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(path) DO UPDATE SET
-                    sha256=excluded.sha256,
-                    size_bytes=excluded.size_bytes,
-                    mtime=excluded.mtime,
-                    type=excluded.type,
-                    width=excluded.width,
-                    height=excluded.height,
-                    duration=excluded.duration,
-                    analyzed_at=excluded.analyzed_at
-                """,
-                (
-                    str(path), sha256, size_bytes, mtime, mtype,
-                    width, height, duration, time.time()
-                )
-            )
-            media_id = cur.lastrowid
-            if media_id == 0:
-                cur = conn.execute("SELECT id FROM media WHERE path = ?", (str(path),))
-                row = cur.fetchone()
-                media_id = row[0]
-            return media_id
-
-    def delete_detections_for_media(self, media_id: int):
-        with self.connect() as conn:
-            conn.execute("DELETE FROM detections WHERE media_id = ?", (media_id,))
-
-    def insert_detections(self, media_id: int, rows: List[Tuple]):
-        with self.connect() as conn:
-            conn.executemany(
-                """
-                INSERT INTO detections
-                (media_id, frame_time, box_x1, box_y1, box_x2, box_y2, score, label)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                rows
-            )
+        conn = self._begin()
+        params = (
+            str(path), sha256, size_bytes, mtime, mtype,
+            width, height, duration, time.time(), content_sig
+        )
+        if HAS_RETURNING:
+            return conn.execute(SQL_UPSERT_MEDIA_RETURNING, params).fetchone()[0]
+        # lastrowid não é atualizado quando o upsert cai no UPDATE (a conexão é
+        # reaproveitada, então ele pode conter o id de outra tabela): busca o id
+        conn.execute(SQL_UPSERT_MEDIA, params)
+        return conn.execute(SQL_SELECT_MEDIA_ID, (str(path),)).fetchone()[0]
+
+    def update_media_stat(self, path: Path, size_bytes: int, mtime: float, content_sig: str):
+        self._begin().execute(SQL_UPDATE_MEDIA_STAT, (size_bytes, mtime, content_sig, str(path)))
+        self._file_done()
+
+    def replace_detections(self, media_id: int, dets: "np.ndarray"):
+        """
+        Troca as detecções da mídia (array DET_DTYPE). O DELETE roda na hora; as
+        novas linhas ficam pendentes e entram com as dos outros arquivos do lote
+        em flush().
+        """
+        self._begin().execute(SQL_DELETE_DET, (media_id,))
+        if len(dets):
+            self._pending_detections.append((media_id, dets))
+        self._file_done()
 
 
 # -------------------------------
@@ -216,50 +457,221 @@ class DB:
 # -------------------------------
 
 class NudeNetWrapper:
-    def __init__(self):
+    def __init__(self, intra_threads: Optional[int] = None):
         if NudeDetector is None:
             raise RuntimeError(
                 "NudeNet não encontrado. Instale com: pip install nudenet\n"
                 "E lembre-se do TensorFlow (CPU ou GPU)."
             )
         self.detector = NudeDetector()
+        self._configure_session(intra_threads)
+        session = getattr(self.detector, "onnx_session", None)
+        providers = session.get_providers() if session is not None else []
+        self.on_gpu = any(p != "CPUExecutionProvider" for p in providers)
+        self.direct = (_nn_read_image is not None and session is not None
+                       and hasattr(self.detector, "input_name") and hasattr(self.detector, "input_width"))
+        # Frames decodificados ficam na GPU até a inferência (ffmpegcv.toCUDA + IO binding)
+        self.gpu_resident = (self.on_gpu and self.direct and ffmpegcv is not None
+                             and hasattr(ffmpegcv, "toCUDA") and _torch_cuda_available())
+        self._warmup()
+
+    def _warmup(self):
+        # A primeira inferência inclui otimização do grafo / alocação na GPU:
+        # paga aqui, fora do primeiro arquivo real
+        if np is None:
+            return
+        size = getattr(self.detector, "input_width", 320)
+        self._dummy = np.zeros((size, size, 3), dtype=np.uint8)
+        try:
+            self.detect_image_array(self._dummy)
+        except Exception:
+            pass
+
+    def _configure_session(self, intra_threads: Optional[int]):
+        """
+        Recria a sessão ONNX do NudeDetector com número de threads explícito
+        (default: núcleos - 2, deixando espaço para decode e hash) e, se o
+        onnxruntime tiver o TensorRT EP, em FP16 via TensorRT (engine guardado em
+        TRT_CACHE_DIR e reaproveitado nas próximas execuções). Em qualquer falha
+        mantém a sessão padrão do NudeDetector.
+        """
+        if ort is None:
+            return
+        import nudenet
+        model_path = os.path.join(os.path.dirname(nudenet.__file__), "320n.onnx")
+        if not os.path.exists(model_path):
+            return
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = intra_threads or max(1, (os.cpu_count() or 1) - 2)
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        available = ort.get_available_providers()
+        providers = ["CPUExecutionProvider"]
+        if "CUDAExecutionProvider" in available:
+            providers.insert(0, ("CUDAExecutionProvider", {"cudnn_conv_algo_search": "EXHAUSTIVE"}))
+        if "TensorrtExecutionProvider" in available:
+            TRT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            trt_options = {
+                "trt_fp16_enable": True,
+                "trt_engine_cache_enable": True,
+                "trt_engine_cache_path": str(TRT_CACHE_DIR),
+                "trt_builder_optimization_level": 5,
+            }
+            try:
+                self.detector.onnx_session = ort.InferenceSession(
+                    model_path, sess_options=opts,
+                    providers=[("TensorrtExecutionProvider", trt_options), *providers],
+                )
+                print(f"[INFO] NudeNet usando TensorRT FP16 (cache em {TRT_CACHE_DIR})")
+                return
+            except Exception as e:
+                print(f"[WARN] TensorRT indisponível, usando CUDA/CPU: {e}", file=sys.stderr)
+        # Em CUDA (sem TensorRT) roda o modelo convertido para FP16
+        fp16_path = fp16_model_path(model_path) if len(providers) > 1 else None
+        if fp16_path:
+            try:
+                self.detector.onnx_session = ort.InferenceSession(fp16_path, sess_options=opts, providers=providers)
+                print(f"[INFO] NudeNet usando modelo FP16 ({fp16_path})")
+                return
+            except Exception as e:
+                print(f"[WARN] Modelo FP16 falhou, usando FP32: {e}", file=sys.stderr)
+        try:
+            self.detector.onnx_session = ort.InferenceSession(model_path, sess_options=opts, providers=providers)
+        except Exception as e:
+            print(f"[WARN] Não foi possível configurar a sessão ONNX, usando a padrão: {e}", file=sys.stderr)
+
+    def default_batch_size(self) -> int:
+        # Em GPU vale agrupar frames por chamada; em CPU não há ganho
+        return GPU_BATCH_SIZE if self.on_gpu else 1
 
     def detect_image_path(self, path: Path) -> List[dict]:
         return self.detector.detect(str(path))
 
     def detect_image_array(self, bgr_image) -> List[dict]:
-        try:
-            return self.detector.detect(bgr_image)
-        except Exception:
-            # fallback via arquivo temporário
-            import tempfile
-            import cv2 as _cv2
-            fd, tmp = tempfile.mkstemp(suffix=".jpg")
-            os.close(fd)
-            try:
-                _cv2.imwrite(tmp, bgr_image)
-                return self.detector.detect(tmp)
-            finally:
-                try:
-                    os.remove(tmp)
-                except Exception:
-                    pass
+        if self.direct:
+            return self._detect_arrays([bgr_image])[0]
+        return self.detector.detect(bgr_image)
+
+    @property
+    def input_size(self) -> Optional[int]:
+        """Lado da entrada do modelo quando dá para pré-processar fora do detector (preprocess)."""
+        return self.detector.input_width if self.direct else None
+
+    def preprocess(self, image) -> Tuple:
+        """Entrada do modelo para um caminho ou array BGR: a tupla de _read_image do NudeNet."""
+        return _nn_read_image(image, self.detector.input_width)
+
+    def _detect_arrays(self, frames) -> List[List[dict]]:
+        """Pré-processa os arrays em memória e roda a sessão ONNX uma vez para todos."""
+        return self.detect_preprocessed([self.preprocess(frame) for frame in frames])
+
+    def detect_preprocessed(self, items: list) -> List[List[dict]]:
+        """Roda a sessão ONNX uma vez para várias entradas já pré-processadas (preprocess)."""
+        det = self.detector
+        blobs = []
+        metas = []
+        for blob, x_ratio, y_ratio, x_pad, y_pad, orig_w, orig_h in items:
+            blobs.append(blob)
+            metas.append((x_pad, y_pad, x_ratio, y_ratio, orig_w, orig_h))
+        outputs = det.onnx_session.run(None, {det.input_name: np.vstack(blobs)})
+        return [
+            _nn_postprocess([outputs[0][j:j + 1]], *meta, det.input_width, det.input_height)
+            for j, meta in enumerate(metas)
+        ]
+
+    def preprocess_cuda(self, frames):
+        """
+        Mesmo pré-processamento do NudeNet (_read_image), feito na GPU sobre
+        torch.Tensor (N, 3, H, W) float32 RGB 0..255, como entregue por
+        ffmpegcv.toCUDA(..., tensor_format='chw'): padding até quadrado à
+        direita/embaixo, resize bilinear, /255, canais na ordem BGR.
+        """
+        import torch.nn.functional as F
+
+        det = self.detector
+        _, _, h, w = frames.shape
+        side = max(h, w)
+        x = F.pad(frames, (0, side - w, 0, side - h))
+        x = F.interpolate(x, size=(det.input_height, det.input_width), mode="bilinear", align_corners=False)
+        return (x.flip(1) / 255.0).contiguous()
+
+    def detect_batch_cuda(self, frames) -> List[List[dict]]:
+        """
+        Detecta num lote de frames que já estão na GPU (ver preprocess_cuda) e
+        passa o ponteiro do tensor à sessão via IO binding, sem passar pela
+        memória do host.
+        """
+        import torch
+
+        det = self.detector
+        n, _, h, w = frames.shape
+        side = max(h, w)
+        x = self.preprocess_cuda(frames)
+        torch.cuda.synchronize(x.device)
+
+        binding = det.onnx_session.io_binding()
+        binding.bind_input(name=det.input_name, device_type="cuda", device_id=x.device.index or 0,
+                           element_type=np.float32, shape=tuple(x.shape), buffer_ptr=x.data_ptr())
+        for out in det.onnx_session.get_outputs():
+            binding.bind_output(out.name)
+        det.onnx_session.run_with_iobinding(binding)
+        output = binding.copy_outputs_to_cpu()[0]
+
+        x_pad, y_pad = side - w, side - h
+        return [
+            _nn_postprocess([output[j:j + 1]], x_pad, y_pad, side / w, side / h, w, h,
+                            det.input_width, det.input_height)
+            for j in range(n)
+        ]
+
+    def detect_batch(self, images: list) -> List[List[dict]]:
+        """
+        Detecta em várias imagens (caminhos, arrays BGR, entradas já
+        pré-processadas por preprocess ou um array (N, H, W, 3)) com uma única
+        execução do modelo. Retorna uma lista de detecções por imagem, na mesma
+        ordem.
+        """
+        if np is not None and isinstance(images, np.ndarray):
+            images = list(images)
+        if self.direct:
+            return self.detect_preprocessed([img if isinstance(img, tuple) else self.preprocess(img)
+                                             for img in images])
+        if len(images) == 1 or not hasattr(self.detector, "detect_batch"):
+            return [self.detect_image_array(img) if not isinstance(img, str) else self.detector.detect(img)
+                    for img in images]
+        return self.detector.detect_batch(images, batch_size=len(images))
 
 
 # -------------------------------
 # Varredura / Análise
 # -------------------------------
 
-def scan_paths(root: Path) -> Iterable[Path]:
-    for p in root.rglob("*"):
-        if not p.is_file():
-            continue
-        if infer_media_type(p) is None:
-            continue
-        yield p
+def scan_paths(root: Path) -> Iterable[os.DirEntry]:
+    # scandir: tipo do arquivo vem da leitura do diretório; extensão filtrada antes de qualquer stat.
+    # Gera os DirEntry para o chamador reaproveitar o stat em cache.
+    for entry in walk_files(root):
+        if infer_media_type(entry.name) is not None:
+            yield entry
+
+
+# Tag EXIF Orientation; valores 5 a 8 são rotações de 90°/270°
+EXIF_ORIENTATION = 0x0112
 
 
 def get_image_size(path: Path) -> Tuple[Optional[int], Optional[int]]:
+    # Pillow lê só o cabeçalho (não decodifica os pixels). O cv2.imread, que
+    # o detector usa, aplica a orientação do EXIF: troca largura/altura igual
+    if Image is not None:
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+                if img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                    width, height = height, width
+                return width, height
+        except Exception:
+            pass
     if cv2 is None:
         return None, None
     try:
@@ -272,6 +684,46 @@ def get_image_size(path: Path) -> Tuple[Optional[int], Optional[int]]:
         return None, None
 
 
+# Decode por hardware no OpenCV: None = ainda não testado; True = já funcionou
+# em algum arquivo (a decisão passa a ser por arquivo); False = backend sem
+# suporte (não tenta de novo)
+_hw_decode_ok: Optional[bool] = None
+# Arquivos seguidos abertos sem aceleração, antes de qualquer sucesso, para
+# concluir que o backend não tem decode por hardware. Um único arquivo não
+# basta: pode ser um codec que o hardware não decodifica (ex.: MJPEG)
+HW_DECODE_MAX_MISSES = 3
+_hw_decode_misses = 0
+
+
+def open_video(path: Path):
+    """
+    Abre o vídeo com o backend FFMPEG e decode por hardware (NVDEC/VAAPI/QSV,
+    OpenCV >= 4.5). Se a aceleração não estiver disponível para o arquivo, usa
+    a abertura padrão; o hardware só deixa de ser tentado quando o backend
+    claramente não tem suporte.
+    """
+    global _hw_decode_ok, _hw_decode_misses
+    if _hw_decode_ok is None and (not hasattr(cv2, "CAP_PROP_HW_ACCELERATION")
+                                  or not cv2.videoio_registry.hasBackend(cv2.CAP_FFMPEG)):
+        _hw_decode_ok = False
+    if _hw_decode_ok is not False:
+        # Sem CAP_PROP_HW_DEVICE: o FFMPEG backend não aceita device junto com ANY
+        cap = cv2.VideoCapture(str(path), cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            if cap.get(cv2.CAP_PROP_HW_ACCELERATION) != cv2.VIDEO_ACCELERATION_NONE:
+                _hw_decode_ok = True
+                return cap
+            # Abriu, mas sem aceleração (codec sem suporte ou backend sem hardware)
+            if _hw_decode_ok is None:
+                _hw_decode_misses += 1
+                if _hw_decode_misses >= HW_DECODE_MAX_MISSES:
+                    _hw_decode_ok = False
+        # Arquivo que nem abre (corrompido) não diz nada sobre o hardware
+        cap.release()
+    return cv2.VideoCapture(str(path))
+
+
 def get_video_meta(path: Path) -> Tuple[Optional[int], Optional[int], Optional[float]]:
     if cv2 is None:
         return None, None, None
@@ -289,79 +741,449 @@ def get_video_meta(path: Path) -> Tuple[Optional[int], Optional[int], Optional[f
         cap.release()
 
 
-def analyze_image(detector: NudeNetWrapper, path: Path, ignored: set) -> List[Tuple]:
-    detections = detector.detect_image_path(path)
-    rows: List[Tuple] = []
+# Rótulo do detector -> label_id; são poucas classes, então cada uma é
+# normalizada (maiúsculas) e registrada só uma vez
+_LABEL_NORM: dict = {}
+
+
+def empty_detections():
+    return np.empty(0, dtype=DET_DTYPE)
+
+
+def concat_detections(parts: List) -> "np.ndarray":
+    if not parts:
+        return empty_detections()
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def detections_to_array(detections: List[dict], frame_time: Optional[float], ignored: set) -> "np.ndarray":
+    """Converte a saída do detector num array DET_DTYPE (sem tuplas por detecção)."""
+    kept: List[dict] = []
+    ids: List[int] = []
     for d in detections:
-        box = d.get("box") or [None, None, None, None]
-        score = float(d.get("score", 0.0))
         raw_label = d.get("label") or d.get("class") or d.get("name") or d.get("title") or ""
-        label = str(raw_label).upper()
-        if label and label in ignored:
+        lid = _LABEL_NORM.get(raw_label)
+        if lid is None:
+            lid = _LABEL_NORM[raw_label] = label_id(str(raw_label).upper())
+        if not LABELS[lid] or LABELS[lid] in ignored:
             continue
+        kept.append(d)
+        ids.append(lid)
+    out = np.empty(len(kept), dtype=DET_DTYPE)
+    if not kept:
+        return out
 
-        rows.append((None,
-                     None,
-                     int(box[0]) if box[0] is not None else None,
-                     int(box[1]) if box[1] is not None else None,
-                     int(box[2]) if box[2] is not None else None,
-                     int(box[3]) if box[3] is not None else None,
-                     score, label))
-    return rows
+    # Caixas e scores convertidos de uma vez (astype trunca como int())
+    boxes = np.asarray([d.get("box") or (0, 0, 0, 0) for d in kept], dtype=np.float64).astype(np.int64)
+    out["frame_time"] = np.nan if frame_time is None else frame_time
+    out["x1"], out["y1"], out["x2"], out["y2"] = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    out["score"] = np.fromiter((d.get("score", 0.0) for d in kept), dtype=np.float64, count=len(kept))
+    out["label_id"] = ids
+    return out
 
 
-def analyze_video(detector: NudeNetWrapper, path: Path, interval_s: float, ignored: set) -> List[Tuple]:
-    if cv2 is None:
-        raise RuntimeError("OpenCV não está instalado. Instale com: pip install opencv-python")
+def analyze_image(detector: NudeNetWrapper, path: Path, ignored: set) -> "np.ndarray":
+    return detections_to_array(detector.detect_image_path(path), None, ignored)
 
-    cap = cv2.VideoCapture(str(path))
-    if not cap.isOpened():
-        print(f"[WARN] Não foi possível abrir o vídeo: {path}", file=sys.stderr)
-        return []
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
-    duration = (cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0) / fps if fps > 0 else None
+def analyze_images(detector: NudeNetWrapper, images: list, ignored: set) -> List["np.ndarray"]:
+    """
+    Analisa várias imagens (caminhos ou entradas já pré-processadas por
+    NudeNetWrapper.preprocess) numa única chamada ao detector; um array
+    DET_DTYPE por imagem.
+    """
+    results = detector.detect_batch([img if isinstance(img, tuple) else str(img) for img in images])
+    return [detections_to_array(dets, None, ignored) for dets in results]
+
 
-    rows: List[Tuple] = []
-    t = 0.0
+def fp16_model_path(model_path: str) -> Optional[str]:
+    """
+    Converte o modelo ONNX para FP16 (entradas/saídas continuam float32, então o
+    pré/pós-processamento não muda) e guarda em MODEL_CACHE_DIR; as próximas
+    execuções só reaproveitam o arquivo. None se onnx/onnxconverter-common
+    não estiverem instalados ou a conversão falhar.
+    """
+    dst = MODEL_CACHE_DIR / f"{Path(model_path).stem}.fp16.onnx"
+    if dst.exists() and dst.stat().st_mtime >= os.path.getmtime(model_path):
+        return str(dst)
+    try:
+        import onnx
+        from onnxconverter_common import float16
+    except Exception:
+        return None
     try:
+        model = float16.convert_float_to_float16(onnx.load(model_path), keep_io_types=True)
+        MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_suffix(".tmp")
+        onnx.save(model, str(tmp))
+        os.replace(tmp, dst)
+        return str(dst)
+    except Exception as e:
+        print(f"[WARN] Conversão para FP16 falhou: {e}", file=sys.stderr)
+        return None
+
+
+def _torch_cuda_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+class FrameBatch:
+    """
+    Acumula frames amostrados num buffer contíguo (batch, H, W, 3) e manda o
+    lote inteiro ao detector quando enche. slot() devolve a próxima posição livre
+    para o decoder escrever direto nela, sem cópia nem alocação por frame.
+    """
+
+    def __init__(self, detector: NudeNetWrapper, batch_size: int, ignored: set, width: int, height: int):
+        self.detector = detector
+        self.batch_size = batch_size
+        self.ignored = ignored
+        self.buf = np.empty((batch_size, height, width, 3), dtype=np.uint8) if width > 0 and height > 0 else None
+        self.times: List[float] = []
+        self.parts: List = []
+
+    def slot(self):
+        return self.buf[len(self.times)] if self.buf is not None else None
+
+    def push(self, t: float, frame):
+        n = len(self.times)
+        if self.buf is None or frame.shape != self.buf.shape[1:]:
+            # Dimensão diferente da informada pelo container: realoca o buffer
+            self.flush()
+            self.buf = np.empty((self.batch_size, *frame.shape[:2], 3), dtype=np.uint8)
+            n = 0
+            self.buf[n] = frame
+        elif not np.shares_memory(frame, self.buf):
+            self.buf[n] = frame
+        self.times.append(t)
+        if len(self.times) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.times:
+            return
+        for t, dets in zip(self.times, self.detector.detect_batch(self.buf[:len(self.times)])):
+            if dets:
+                self.parts.append(detections_to_array(dets, float(t), self.ignored))
+        self.times.clear()
+
+    @property
+    def detections(self):
+        return concat_detections(self.parts)
+
+
+# None = ainda não testado; False = sem NVDEC via ffmpegcv (não tenta de novo)
+_nv_decode_ok: Optional[bool] = None
+
+
+def _nvdec_available() -> bool:
+    """
+    Checagem única, independente de arquivo: ffmpegcv importado e alguma GPU
+    NVIDIA visível. Sem como contar as GPUs, supõe que sim (cada arquivo que
+    falhar cai no OpenCV).
+    """
+    global _nv_decode_ok
+    if _nv_decode_ok is None:
+        if ffmpegcv is None:
+            _nv_decode_ok = False
+        else:
+            try:
+                from ffmpegcv.video_info import get_num_NVIDIA_GPUs
+                _nv_decode_ok = get_num_NVIDIA_GPUs() > 0
+            except Exception:
+                _nv_decode_ok = True
+    return _nv_decode_ok
+
+
+def _analyze_video_nv(path: Path, interval_s: float, make_batch) -> Optional["np.ndarray"]:
+    """
+    Decodifica com ffmpegcv.VideoCaptureNV (NVDEC, leitura sequencial) e amostra
+    por índice de frame. Retorna None se o NVDEC não estiver disponível ou não
+    abrir/entregar nenhum frame deste arquivo, para o chamador usar o OpenCV.
+    Falha num arquivo (corrompido, codec sem NVDEC) não desliga o NVDEC para
+    os próximos.
+    """
+    if not _nvdec_available():
+        return None
+    try:
+        cap = ffmpegcv.VideoCaptureNV(str(path), pix_fmt="bgr24")
+    except Exception:
+        return None
+
+    try:
+        fps = float(getattr(cap, "fps", 0.0) or 0.0)
+        step = max(1, int(round(fps * interval_s))) if fps > 0 else 1
+        batch = make_batch(int(getattr(cap, "width", 0) or 0), int(getattr(cap, "height", 0) or 0))
+        frame_idx = 0
         while True:
-            if duration is not None and t > duration:
-                break
-            cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000.0)
             ok, frame = cap.read()
             if not ok or frame is None:
                 break
+            if frame_idx % step == 0:
+                batch.push(frame_idx / fps if fps > 0 else frame_idx * interval_s, frame)
+            frame_idx += 1
+    finally:
+        cap.release()
 
-            dets = detector.detect_image_array(frame)
-            for d in dets:
-                box = d.get("box") or [None, None, None, None]
-                score = float(d.get("score", 0.0))
-                raw_label = d.get("label") or d.get("class") or d.get("name") or d.get("title") or ""
-                label = str(raw_label).upper()
-                if label and label in ignored:
-                    continue
+    if frame_idx == 0:
+        return None
+    batch.flush()
+    return batch.detections
+
+
+# Caminho GPU (ffmpegcv.toCUDA): None = ainda não validado; True = validado;
+# False = desligado nesta execução
+_cuda_path_ok: Optional[bool] = None
+# Diferença média máxima (entrada do modelo, escala 0..1) aceita entre o
+# pré-processamento na GPU e o _read_image do NudeNet no frame de validação;
+# sobra margem só para nv12->RGB e resize, não para layout/canais/escala trocados
+CUDA_CHECK_TOLERANCE = 0.03
+
+
+def _cuda_matches_cpu(detector: NudeNetWrapper, path: Path, gpu_frame) -> Optional[bool]:
+    """
+    Compara a entrada do modelo montada na GPU para o primeiro frame do vídeo
+    com a do _read_image do NudeNet sobre o mesmo frame decodificado pelo
+    OpenCV. Pega layout (CHW/HWC), ordem de canais ou escala diferentes do
+    esperado, que dariam detecções erradas sem nenhum erro. None se o OpenCV
+    não ler o frame (o próximo vídeo tenta de novo).
+    """
+    cap = cv2.VideoCapture(str(path))
+    try:
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    if not ok or frame is None:
+        return None
+    gpu = detector.preprocess_cuda(gpu_frame).cpu().numpy()
+    cpu = _nn_read_image(frame, detector.detector.input_width)[0]
+    if gpu.shape != cpu.shape:
+        print(f"[WARN] Caminho GPU desligado: entrada {gpu.shape}, esperado {cpu.shape}", file=sys.stderr)
+        return False
+    diff = float(np.abs(gpu - cpu).mean())
+    if diff > CUDA_CHECK_TOLERANCE:
+        print(f"[WARN] Caminho GPU desligado: difere do pré-processamento em CPU (média {diff:.4f})",
+              file=sys.stderr)
+        return False
+    return True
+
+
+def _analyze_video_cuda(detector: NudeNetWrapper, path: Path, interval_s: float, ignored: set,
+                        batch_size: int) -> Optional["np.ndarray"]:
+    """
+    NVDEC (nv12) -> conversão para RGB na GPU (ffmpegcv.toCUDA) -> lote torch na
+    GPU -> detect_batch_cuda. O ffmpeg ainda entrega o nv12 pelo pipe, mas
+    com metade dos bytes do bgr24, e a conversão/resize não passam pela CPU.
+
+    Depende de detalhes do ffmpegcv (cap.vid, read_torch, torch_device); no
+    primeiro vídeo o primeiro frame é conferido com o caminho em CPU
+    (_cuda_matches_cpu). Se não bater, ou se a API não for a esperada, o
+    caminho fica desligado até o fim da execução. Retorna None em qualquer
+    falha, para o chamador usar o caminho numpy.
+    """
+    global _cuda_path_ok
+    if _cuda_path_ok is False or not _nvdec_available():
+        return None
+    try:
+        import torch
+        cap = ffmpegcv.toCUDA(ffmpegcv.VideoCaptureNV(str(path), pix_fmt="nv12"), tensor_format="chw")
+    except (ImportError, AttributeError, TypeError) as e:
+        # API diferente da esperada: não adianta tentar nos próximos arquivos
+        print(f"[WARN] Caminho GPU desligado (ffmpegcv/torch): {e}", file=sys.stderr)
+        _cuda_path_ok = False
+        return None
+    except Exception:
+        return None
+
+    parts: List = []
+    frame_idx = 0
+    try:
+        fps = float(cap.fps or 0.0)
+        step = max(1, int(round(fps * interval_s))) if fps > 0 else 1
+        buf = torch.empty((batch_size, 3, cap.height, cap.width), dtype=torch.float32, device=cap.torch_device)
+        times: List[float] = []
+
+        def flush():
+            for t, dets in zip(times, detector.detect_batch_cuda(buf[:len(times)])):
+                if dets:
+                    parts.append(detections_to_array(dets, float(t), ignored))
+            times.clear()
+
+        while True:
+            if frame_idx % step != 0:
+                # Frame descartado: só decodifica, sem converter na GPU
+                ok, _ = cap.vid.read()
+            else:
+                ok, _ = cap.read_torch(buf[len(times)])
+                if ok and _cuda_path_ok is None:
+                    _cuda_path_ok = _cuda_matches_cpu(detector, path, buf[:1])
+                    if not _cuda_path_ok:
+                        return None
+                if ok:
+                    times.append(frame_idx / fps if fps > 0 else frame_idx * interval_s)
+                    if len(times) >= batch_size:
+                        flush()
+            if not ok:
+                break
+            frame_idx += 1
+        flush()
+    except (AttributeError, TypeError) as e:
+        print(f"[WARN] Caminho GPU desligado (ffmpegcv/torch): {e}", file=sys.stderr)
+        _cuda_path_ok = False
+        return None
+    except Exception as e:
+        # Falha do arquivo (ou antes de validar): só este vídeo vai para a CPU
+        print(f"[WARN] Decode na GPU falhou em {path}, usando CPU: {e}", file=sys.stderr)
+        return None
+    finally:
+        cap.release()
+
+    return concat_detections(parts) if frame_idx > 0 else None
+
+
+def analyze_video(detector: NudeNetWrapper, path: Path, interval_s: float, ignored: set,
+                  batch_size: int = 1) -> "np.ndarray":
+    if cv2 is None:
+        raise RuntimeError("OpenCV não está instalado. Instale com: pip install opencv-python")
+
+    def make_batch(width, height):
+        return FrameBatch(detector, batch_size, ignored, width, height)
+
+    dets = None
+    if detector.gpu_resident:
+        dets = _analyze_video_cuda(detector, path, interval_s, ignored, batch_size)
+    if dets is None:
+        dets = _analyze_video_nv(path, interval_s, make_batch)
+    if dets is not None:
+        return dets
+
+    cap = open_video(path)
+    if not cap.isOpened():
+        print(f"[WARN] Não foi possível abrir o vídeo: {path}", file=sys.stderr)
+        return empty_detections()
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    # Leitura sequencial: grab() avança sem decodificar a imagem completa;
+    # retrieve() só nos frames amostrados (a cada `step` frames)
+    step = max(1, int(round(fps * interval_s))) if fps > 0 else 1
+    batch = make_batch(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
 
-                rows.append((None,
-                             float(t),
-                             int(box[0]) if box[0] is not None else None,
-                             int(box[1]) if box[1] is not None else None,
-                             int(box[2]) if box[2] is not None else None,
-                             int(box[3]) if box[3] is not None else None,
-                             score, label))
-            t += max(0.001, interval_s)
+    frame_idx = 0
+    try:
+        while cap.grab():
+            if frame_idx % step != 0:
+                frame_idx += 1
+                continue
+            slot = batch.slot()
+            ok, frame = cap.retrieve(slot) if slot is not None else cap.retrieve()
+            t = frame_idx / fps if fps > 0 else frame_idx * interval_s
+            frame_idx += 1
+            if not ok or frame is None:
+                continue
+            batch.push(t, frame)
+        batch.flush()
     finally:
         cap.release()
 
-    return rows
+    return batch.detections
 
 
-def needs_reanalysis(db: DB, path: Path, sha: str, size: int, mtime: float) -> bool:
-    row = db.get_media_by_path(path)
+def needs_reanalysis(row: Optional[Tuple], size: int, mtime: float) -> bool:
+    # Só tamanho e mtime: arquivo inalterado não precisa nem ser lido para o sha256
     if row is None:
         return True
-    _, _, sha_db, size_db, mtime_db, *_ = row
-    return (sha_db != sha) or (size_db != size) or (abs(mtime_db - mtime) > 1e-6)
+    _, _, _, size_db, mtime_db, *_ = row
+    return (size_db != size) or (abs(mtime_db - mtime) > 1e-6)
+
+
+def content_unchanged(row: Tuple, path: Path) -> Optional[str]:
+    """
+    Para um arquivo já registrado cujo tamanho/mtime mudou: compara primeiro a
+    assinatura amostrada (generate_file_hash, poucos KB lidos) e só se ela bater
+    confirma com o sha256 completo. Retorna a assinatura se o conteúdo é o mesmo
+    (só mtime mudou, ex.: cópia ou touch), senão None.
+    """
+    _, _, sha_db, _, _, sig_db = row
+    if not sig_db:
+        return None
+    sig = generate_file_hash(path)
+    if sig != sig_db or sha256_file(path) != sha_db:
+        return None
+    return sig
+
+
+def prepare_media(path: Path, media_type: str, size: int, mtime: float,
+                  detector: Optional[NudeNetWrapper] = None) -> Tuple:
+    """
+    Parte de I/O da análise (hashes + dimensões), executada nas threads de leitura.
+    Com detector (e input_size disponível) a imagem já sai decodificada e
+    reduzida à entrada do modelo (último item; o cv2 libera o GIL): o detector
+    não relê o arquivo e só a entrada de 320x320 fica em memória até o lote.
+    """
+    sha = sha256_file(path)
+    sig = generate_file_hash(path)
+    model_input = None
+    duration = None
+    if media_type == "image":
+        frame = None
+        if detector is not None and detector.input_size and cv2 is not None:
+            frame = cv2.imread(str(path))
+        if frame is not None:
+            height, width = frame.shape[:2]
+            model_input = detector.preprocess(frame)
+            del frame
+        else:
+            width, height = get_image_size(path)
+    else:
+        width, height, duration = get_video_meta(path)
+    return path, media_type, sha, sig, size, mtime, width, height, duration, model_input
+
+
+# Detector de cada processo do pool de imagens (criado uma vez pelo initializer)
+_worker_detector: Optional[NudeNetWrapper] = None
+_worker_ignored: set = set()
+# Rótulos conhecidos antes de qualquer detecção (os mesmos em todo processo)
+_base_labels = len(LABELS)
+
+
+def _init_image_worker(ignored: set):
+    global _worker_detector, _worker_ignored
+    # Vários processos dividindo os núcleos: uma thread de inferência/decode cada
+    if cv2 is not None:
+        cv2.setNumThreads(1)
+    _worker_detector = NudeNetWrapper(intra_threads=1)
+    _worker_ignored = ignored
+
+
+def _scan_image_worker(job: Tuple) -> Tuple:
+    """
+    Lê, hasheia e analisa uma imagem num processo do pool:
+    (prepared, detecções, rótulos extras do processo, erro).
+    """
+    path, size, mtime = job
+    try:
+        prepared = prepare_media(path, "image", size, mtime)
+        dets = analyze_image(_worker_detector, path, _worker_ignored)
+        return prepared, dets, LABELS[_base_labels:], None
+    except Exception as e:
+        return (path,), None, None, str(e)
+
+
+def remap_labels(dets: "np.ndarray", base: int, extra: List[str]) -> "np.ndarray":
+    """
+    Traduz os label_id de um worker (ids >= base vieram de rótulos fora da
+    lista do NudeNet, numerados no processo dele) para o LABELS local.
+    """
+    if not extra or not len(dets):
+        return dets
+    lookup = np.arange(base + len(extra), dtype=np.int16)
+    lookup[base:] = [label_id(name) for name in extra]
+    dets["label_id"] = lookup[dets["label_id"]]
+    return dets
 
 
 # -------------------------------
@@ -385,39 +1207,21 @@ def cmd_scan(args):
     detector = NudeNetWrapper()
 
     # Conjunto de labels ignoradas
-    ignored = set(s.upper() for s in IGNORED_LABELS_DEFAULT)
-    if getattr(args, "ignore_label", None):
-        ignored.update(s.upper() for s in args.ignore_label)
+    ignored = frozenset(s.upper() for s in IGNORED_LABELS_DEFAULT | set(getattr(args, "ignore_label", None) or ()))
+
+    batch_size = args.batch_size or detector.default_batch_size()
+    # Em CPU, imagens em processos separados (o ONNX Runtime escala mal com
+    # threads). Em GPU fica tudo neste processo: as imagens vão em lote para a
+    # sessão já aberta, sem uma sessão CUDA/TensorRT extra por processo
+    workers = args.workers or (1 if detector.on_gpu else max(1, (os.cpu_count() or 1) // 2))
 
     total_files = 0
     new_or_updated = 0
     skipped = 0
 
-    for path in scan_paths(root):
-        total_files += 1
-        media_type = infer_media_type(path)
-        size = path.stat().st_size
-        mtime = path.stat().st_mtime
-        sha = sha256_file(path)
-
-        if not needs_reanalysis(db, path, sha, size, mtime):
-            skipped += 1
-            continue
-
-        width = height = None
-        duration = None
-
-        try:
-            if media_type == "image":
-                width, height = get_image_size(path)
-                det_rows = analyze_image(detector, path, ignored)
-            else:
-                width, height, duration = get_video_meta(path)
-                det_rows = analyze_video(detector, path, args.video_interval, ignored)
-        except Exception as e:
-            print(f"[WARN] Falha ao analisar {path}: {e}", file=sys.stderr)
-            continue
-
+    def save(prepared, dets):
+        nonlocal new_or_updated
+        path, media_type, sha, sig, size, mtime, width, height, duration = prepared[:9]
         media_id = db.upsert_media(
             path=path,
             sha256=sha,
@@ -426,17 +1230,127 @@ def cmd_scan(args):
             mtype=media_type,
             width=width,
             height=height,
-            duration=duration
+            duration=duration,
+            content_sig=sig
         )
-
-        db.delete_detections_for_media(media_id)
-        if det_rows:
-            rows = [(media_id, *row[1:]) for row in det_rows]
-            db.insert_detections(media_id, rows)
+        db.replace_detections(media_id, dets)
 
         new_or_updated += 1
-        if (len(det_rows)>0):
-           print(f"{path}")
+        # Uma linha por arquivo (nunca por detecção); contagem só com -v
+        if args.verbose:
+            print(f"{path}: {len(dets)} detecções")
+        elif len(dets):
+            print(f"{path}")
+
+    # Imagens pendentes (tuplas de prepare_media), analisadas em lote
+    pending_images = []
+
+    def flush_images():
+        paths = [item[0] for item in pending_images]
+        images = [item[9] if item[9] is not None else item[0] for item in pending_images]
+        try:
+            results = analyze_images(detector, images, ignored)
+        except Exception:
+            # Um arquivo ruim derruba o lote: refaz um a um para isolar a falha
+            results = []
+            for p in paths:
+                try:
+                    results.append(analyze_image(detector, p, ignored))
+                except Exception as e:
+                    print(f"[WARN] Falha ao analisar {p}: {e}", file=sys.stderr)
+                    results.append(None)
+        for prepared, dets in zip(pending_images, results):
+            if dets is not None:
+                save(prepared, dets)
+        pending_images.clear()
+
+    def analyze(prepared):
+        path, media_type = prepared[:2]
+        if media_type == "image":
+            pending_images.append(prepared)
+            if len(pending_images) >= batch_size:
+                flush_images()
+            return
+        try:
+            dets = analyze_video(detector, path, args.video_interval, ignored, batch_size)
+        except Exception as e:
+            print(f"[WARN] Falha ao analisar {path}: {e}", file=sys.stderr)
+            return
+        save(prepared, dets)
+
+    def consume(future):
+        try:
+            prepared = future.result()
+        except Exception as e:
+            print(f"[WARN] Falha ao ler arquivo: {e}", file=sys.stderr)
+            return
+        analyze(prepared)
+
+    # Pool de processos para imagens, alimentado durante a varredura
+    image_pool = None
+    pool_results = deque()
+    if workers > 1:
+        # spawn: o processo principal já inicializou o ONNX Runtime/CUDA
+        image_pool = multiprocessing.get_context("spawn").Pool(
+            workers, initializer=_init_image_worker, initargs=(ignored,))
+
+    def consume_pool(result):
+        prepared, dets, extra_labels, err = result.get()
+        if err is not None:
+            print(f"[WARN] Falha ao analisar {prepared[0]}: {err}", file=sys.stderr)
+            return
+        save(prepared, remap_labels(dets, _base_labels, extra_labels))
+
+    # Leitura/hash em threads (hashlib e o I/O liberam o GIL) enquanto esta thread
+    # roda o detector e grava no DB; no máximo PREFETCH arquivos adiantados.
+    in_flight = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+            for entry in scan_paths(root):
+                total_files += 1
+                path = Path(entry.path)
+                media_type = infer_media_type(entry.name)
+                st = entry.stat(follow_symlinks=False)
+                size = st.st_size
+                mtime = st.st_mtime
+
+                row = db.get_media_by_path(path)
+                if not needs_reanalysis(row, size, mtime):
+                    skipped += 1
+                    continue
+                if row is not None:
+                    sig = content_unchanged(row, path)
+                    if sig is not None:
+                        # Mesmo conteúdo: só atualiza tamanho/mtime, sem rodar o detector
+                        db.update_media_stat(path, size, mtime, sig)
+                        skipped += 1
+                        continue
+
+                if image_pool is not None and media_type == "image":
+                    pool_results.append(image_pool.apply_async(_scan_image_worker, ((path, size, mtime),)))
+                    # Grava o que já terminou; espera só se o pool estiver muito à frente
+                    while pool_results and (pool_results[0].ready() or len(pool_results) > workers * POOL_BACKLOG):
+                        consume_pool(pool_results.popleft())
+                    continue
+
+                in_flight.append(pool.submit(prepare_media, path, media_type, size, mtime, detector))
+                if len(in_flight) >= PREFETCH:
+                    consume(in_flight.popleft())
+            while in_flight:
+                consume(in_flight.popleft())
+        while pool_results:
+            consume_pool(pool_results.popleft())
+    finally:
+        if image_pool is not None:
+            image_pool.terminate()
+
+    if pending_images:
+        flush_images()
+    db.flush()
+    if new_or_updated:
+        # Estatísticas para o planner escolher os índices de cobertura
+        db.connect().execute("ANALYZE")
+    db.close()
 
     print(f"\nResumo: analisados/atualizados={new_or_updated}, pulados={skipped}, total_encontrados={total_files}")
     print(f"DB: {db_path}")
@@ -449,15 +1363,16 @@ def cmd_list(args):
         sys.exit(2)
 
     sql = """
-    SELECT m.path, m.type, d.frame_time, d.box_x1, d.box_y1, d.box_x2, d.box_y2, d.score, d.label
+    SELECT m.path, m.type, d.frame_time, d.box_x1, d.box_y1, d.box_x2, d.box_y2, d.score, l.name
     FROM detections d
     JOIN media m ON m.id = d.media_id
+    LEFT JOIN labels l ON l.id = d.label_id
     WHERE 1=1
     """
     params: List = []
 
     if args.label:
-        sql += " AND d.label = ?"
+        sql += " AND l.name = ?"
         params.append(args.label.upper())
     if args.min_score is not None:
         sql += " AND d.score >= ?"
@@ -469,9 +1384,11 @@ def cmd_list(args):
     sql += " ORDER BY d.score DESC LIMIT ?"
     params.append(int(args.limit))
 
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(sql, tuple(params))
-        rows = cur.fetchall()
+    # Mesma conexão/migração do scan (bancos antigos ainda têm detections.label)
+    db = DB(db_path)
+    db.ensure_schema()
+    rows = db.connect().execute(sql, tuple(params)).fetchall()
+    db.close()
 
     import json
     for r in rows:
@@ -529,6 +1446,9 @@ def build_argparser():
     ps.add_argument("--db", default=None, help="Arquivo SQLite; default: <root>/media_scan.sqlite")
     ps.add_argument("--video-interval", type=float, default=1.0, help="Intervalo (s) entre frames no vídeo (default: 1.0s)")
     ps.add_argument("--ignore-label", action="append", default=[], help="Adicionar rótulos a ignorar (pode repetir)")
+    ps.add_argument("-v", "--verbose", action="store_true", help="Mostra a contagem de detecções de cada arquivo analisado")
+    ps.add_argument("--workers", type=int, default=None, help="Processos para analisar imagens (default: 1 em GPU, metade dos núcleos em CPU)")
+    ps.add_argument("--batch-size", type=int, default=None, help="Imagens/frames por chamada ao detector (default: 16 em GPU, 1 em CPU)")
     ps.set_defaults(func=cmd_scan)
 
     # list
@@ -550,12 +1470,15 @@ def build_argparser():
 
 
 def main():
+    # Decode do OpenCV com poucas threads para não disputar núcleos com a inferência
+    if cv2 is not None:
+        cv2.setNumThreads(2)
     parser = build_argparser()
     args = parser.parse_args()
     # default para 'scan' se nenhum subcomando informado
     if not hasattr(args, "func"):
         from argparse import Namespace
-        args = Namespace(cmd="scan", root=DEFAULT_ROOT, db=None, video_interval=1.0, ignore_label=[])
+        args = Namespace(cmd="scan", root=DEFAULT_ROOT, db=None, video_interval=1.0, ignore_label=[], batch_size=None, workers=None, verbose=False)
         return cmd_scan(args)
     args.func(args)
 
@@ -0,0 +1,24 @@
+# exif.py
+
+import atexit
+from exiftool import ExifToolHelper
+
+# Quantidade de arquivos enviados ao exiftool por chamada
+BATCH_SIZE = 500
+
+_et = None
+
+
+def get_et() -> ExifToolHelper:
+    """
+    Retorna um ExifToolHelper compartilhado por todo o processo (modo -stay_open),
+    iniciado na primeira chamada e encerrado na saída do programa.
+    Evita pagar a inicialização do perl em cada etapa do pipeline.
+    """
+    global _et
+    if _et is None:
+        # check_execute=False: um arquivo ilegível não derruba o lote inteiro
+        _et = ExifToolHelper(check_execute=False)
+        _et.run()
+        atexit.register(_et.terminate)
+    return _et
@@ -1,8 +1,21 @@
 # file_utils.py
 
+import errno
 import hashlib
+import mmap
+import os
+import shutil
 from pathlib import Path
 
+import numpy as np
+
+
+# Threads que executam as movimentações (IO-bound)
+MOVE_WORKERS = 16
+
+# Até este tamanho o arquivo é lido de uma vez e as amostras são indexadas em memória
+SAMPLE_READ_ALL_SIZE = 4 * 1024 * 1024
+
 
 def generate_file_hash(file_path: str | Path, num_bytes: int = 1024) -> str:
     """
@@ -14,18 +27,77 @@ def generate_file_hash(file_path: str | Path, num_bytes: int = 1024) -> str:
     if file_size == 0:
         return hashlib.sha256(b'').hexdigest()
 
-    with file_path.open('rb') as f:
-        if file_size <= num_bytes:
+    if file_size <= num_bytes:
+        with file_path.open('rb') as f:
             content = f.read()
-        else:
-            # Seleciona num_bytes espaçados uniformemente
-            positions = [int(i * (file_size - 1) / (num_bytes - 1)) for i in range(num_bytes)]
-            content = bytearray()
-            for pos in positions:
-                f.seek(pos)
-                content.append(f.read(1)[0])
+    else:
+        # Seleciona num_bytes espaçados uniformemente
+        positions = (np.arange(num_bytes, dtype=np.int64) * (file_size - 1) / (num_bytes - 1)).astype(np.int64)
+        content = None
+        with file_path.open('rb') as f:
+            if file_size <= SAMPLE_READ_ALL_SIZE:
+                # Arquivo pequeno: uma leitura só, amostras tiradas do buffer
+                content = np.frombuffer(f.read(), dtype=np.uint8)[positions].tobytes()
+            else:
+                # mmap + gather do numpy: sem uma syscall (nem um frame Python) por amostra
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        content = np.frombuffer(mm, dtype=np.uint8)[positions].tobytes()
+                except (OSError, ValueError, OverflowError, BufferError):
+                    content = None
+        if content is None:
+            # mmap indisponível (NFS/SMB, 32 bits): uma leitura por amostra
+            positions = positions.tolist()
+            if hasattr(os, 'pread'):
+                fd = os.open(file_path, os.O_RDONLY)
+                try:
+                    content = b''.join(os.pread(fd, 1, pos) for pos in positions)
+                finally:
+                    os.close(fd)
+            else:
+                with file_path.open('rb', buffering=0) as f:
+                    content = bytearray()
+                    for pos in positions:
+                        f.seek(pos)
+                        content.append(f.read(1)[0])
 
     hasher = hashlib.sha256()
     hasher.update(file_size.to_bytes(8, 'big'))  # 8 bytes para o tamanho
     hasher.update(content)
-    return hasher.hexdigest()
\ No newline at end of file
+    return hasher.hexdigest()
+
+
+def walk_files(root: str | Path, skip_dirs=()):
+    """
+    Percorre root recursivamente com os.scandir (pilha explícita, sem seguir links),
+    gerando os os.DirEntry dos arquivos regulares. Não materializa a árvore em memória.
+    Subpastas cujo caminho real está em skip_dirs não são percorridas.
+    """
+    skip = {os.path.realpath(d) for d in skip_dirs}
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not skip or os.path.realpath(entry.path) not in skip:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except OSError as e:
+            print(f"[WARN] Could not read folder {current}: {e}")
+
+
+def fast_move(src: str | Path, dst: str | Path) -> None:
+    """
+    Move src para dst com um único rename(2) quando estão no mesmo sistema de arquivos.
+    Só recorre ao shutil.move (cópia + remoção) quando o rename falha com EXDEV.
+    """
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            shutil.move(str(src), str(dst))
+        else:
+            raise
@@ -1,23 +1,43 @@
 # geo_utils.py
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 from pathlib import Path
-from exiftool import ExifToolHelper
+from utils.exif import get_et
 
-def extract_gps_from_image(image_path: Path) -> Optional[Tuple[float, float]]:
+GPS_TAGS = [
+    "EXIF:GPSLatitude", "EXIF:GPSLongitude",
+    "QuickTime:GPSLatitude", "QuickTime:GPSLongitude",
+]
+
+
+def gps_from_metadata(item: dict) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) de um item de metadados do exiftool (lido com -n), ou None."""
+    gps_lat = item.get("EXIF:GPSLatitude") or item.get("QuickTime:GPSLatitude")
+    gps_lon = item.get("EXIF:GPSLongitude") or item.get("QuickTime:GPSLongitude")
+    if gps_lat and gps_lon:
+        try:
+            return float(gps_lat), float(gps_lon)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def extract_gps_from_image(image_path: Union[Path, Sequence[Path]]
+                           ) -> Union[Optional[Tuple[float, float]], List[Optional[Tuple[float, float]]]]:
     """
     Extrai latitude e longitude de uma imagem (caso existam nos metadados EXIF).
     Retorna (latitude, longitude) como floats, ou None se não houver GPS.
+
+    Forma em lote: passando uma lista de caminhos, todos são lidos numa única
+    chamada ao exiftool persistente e o retorno é uma lista na mesma ordem.
     """
-    with ExifToolHelper() as et:
-        metadata = et.get_metadata(str(image_path))
-        if not metadata:
-            return None
-        item = metadata[0]
-        gps_lat = item.get("EXIF:GPSLatitude") or item.get("QuickTime:GPSLatitude")
-        gps_lon = item.get("EXIF:GPSLongitude") or item.get("QuickTime:GPSLongitude")
-        if gps_lat and gps_lon:
-            try:
-                return float(gps_lat), float(gps_lon)
-            except Exception:
-                pass
-    return None
\ No newline at end of file
+    if isinstance(image_path, (list, tuple)):
+        if not image_path:
+            return []
+        metadata = get_et().get_tags([str(p) for p in image_path], tags=GPS_TAGS)
+        by_source = {item.get("SourceFile"): item for item in metadata or []}
+        return [gps_from_metadata(by_source.get(str(p), {})) for p in image_path]
+
+    metadata = get_et().get_metadata(str(image_path))
+    if not metadata:
+        return None
+    return gps_from_metadata(metadata[0])
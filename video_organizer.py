@@ -1,9 +1,8 @@
 import os
 from pathlib import Path
-import shutil
-import exiftool
+from utils.exif import get_et
 from datetime import datetime
-from utils.file_utils import generate_file_hash
+from utils.file_utils import fast_move, generate_file_hash, walk_files
 
 SUPPORTED_VIDEO_EXTENSIONS = {
     '.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.webm', '.mpeg', '.mpg', '.3gp', '.mts', '.m2ts', '.ts', '.m4v', '.vob', '.ogv', '.rm', '.rmvb'
@@ -24,14 +23,22 @@ def extract_video_date(metadata):
                 continue
     return None, 0
 
+def iter_videos(root, skip_dir=None):
+    """
+    Gera (Path, os.stat_result) dos vídeos sob root à medida que o diretório é
+    lido (os.scandir), sem materializar a árvore inteira em memória.
+    skip_dir (a pasta de saída, se estiver dentro de root) não é percorrida:
+    os vídeos movidos para lá durante a varredura não voltam a aparecer.
+    """
+    for entry in walk_files(root, skip_dirs=[skip_dir] if skip_dir else ()):
+        if os.path.splitext(entry.name)[1].lower() in SUPPORTED_VIDEO_EXTENSIONS:
+            yield Path(entry.path), entry.stat(follow_symlinks=False)
+
 def organize_videos(source_folder, output_folder):
     source = Path(source_folder)
     output = Path(output_folder)
 
-    print(f"[START] Scanning folder: {source}")
-    files = list(source.rglob('*'))
-    total_files = len(files)
-    print(f"[INFO] {total_files} total files found.\n")
+    print(f"[START] Scanning folder: {source}\n")
 
     analyzed = 0
     moved = 0
@@ -41,69 +48,65 @@ def organize_videos(source_folder, output_folder):
     skipped_metadata_error = 0
     skipped_unexpected_error = 0
 
-    import json
-    import sys
-    from datetime import datetime as dt
-    import os
-
-    with exiftool.ExifTool() as et:
-        for idx, file_path in enumerate(files, start=1):
-            if file_path.suffix.lower() not in SUPPORTED_VIDEO_EXTENSIONS:
-                continue
-            print(f"[{idx}/{total_files}] Analyzing: {file_path.name}")
-            analyzed += 1
+    # exiftool persistente (-stay_open), compartilhado com o resto do pipeline
+    et = get_et()
+    for file_path, stat in iter_videos(source, skip_dir=output):
+        analyzed += 1
+        print(f"[{analyzed}] Analyzing: {file_path.name}")
+        try:
             try:
-                try:
-                    metadata_bytes = et.execute('-j', str(file_path))
-                    metadata_list = json.loads(metadata_bytes)
-                    metadata = metadata_list[0] if metadata_list else {}
-                except Exception as e:
-                    msg = f"  [ERROR] Could not read metadata: {e}"
-                    print(msg)
-                    skipped_metadata_error += 1
-                    continueg
-                video_date, ms = extract_video_date(metadata)
-                used_exif = True
-                if not video_date:
-                    # Tenta data de modificação do arquivo
-                    stat = file_path.stat()
-                    dt_file = datetime.fromtimestamp(stat.st_mtime)
-                    ms = int((stat.st_mtime - int(stat.st_mtime)) * 1000)
-                    video_date = dt_file
-                    used_exif = False
-
-                # Estrutura: video-date/ano/mes ou video-no-date/ano/mes
-                if used_exif:
-                    target_folder = output / "video-date" / str(video_date.year) / f"{video_date.month:02d}"
-                else:
-                    target_folder = output / "video-no-date" / str(video_date.year) / f"{video_date.month:02d}"
-                target_folder.mkdir(parents=True, exist_ok=True)
+                metadata_list = et.get_metadata(str(file_path))
+                metadata = metadata_list[0] if metadata_list else {}
+            except Exception as e:
+                msg = f"  [ERROR] Could not read metadata: {e}"
+                print(msg)
+                skipped_metadata_error += 1
+                continue
+            video_date, ms = extract_video_date(metadata)
+            used_exif = True
+            if not video_date:
+                # Tenta data de modificação do arquivo (stat já veio do scandir)
+                dt_file = datetime.fromtimestamp(stat.st_mtime)
+                ms = int((stat.st_mtime - int(stat.st_mtime)) * 1000)
+                video_date = dt_file
+                used_exif = False
 
-                ext = file_path.suffix.lower()
-                timestamp_s = int(video_date.timestamp())
-                # Gera hash do arquivo de vídeo
-                video_hash = generate_file_hash(file_path)
-                target_file = target_folder / f"{timestamp_s}{ms:03d}_{video_hash}{ext}"
+            # Estrutura: video-date/ano/mes ou video-no-date/ano/mes
+            if used_exif:
+                target_folder = output / "video-date" / str(video_date.year) / f"{video_date.month:02d}"
+            else:
+                target_folder = output / "video-no-date" / str(video_date.year) / f"{video_date.month:02d}"
+            target_folder.mkdir(parents=True, exist_ok=True)
 
-                if not target_file.exists():
-                    shutil.move(str(file_path), str(target_file))
-                    moved += 1
-                    msg = f"  [MOVED{' - NO EXIF' if not used_exif else ''}] {file_path} -> {target_file}"
-                    print(msg)
-                else:
-                    # Arquivo já existe com o mesmo hash: duplicata real
-                    file_path.unlink()
-                    removed_src += 1
-                    msg = f"  [REMOVED] {file_path} (duplicate hash), kept destination: {target_file}"
-                    print(msg)
+            ext = file_path.suffix.lower()
+            timestamp_s = int(video_date.timestamp())
+            # Gera hash do arquivo de vídeo
+            video_hash = generate_file_hash(file_path)
+            target_file = target_folder / f"{timestamp_s}{ms:03d}_{video_hash}{ext}"
 
-                if not used_exif:
-                    skipped_no_exif += 1
-            except Exception as e:
-                msg = f"  [ERROR] Unexpected error processing {file_path}: {e}"
+            if file_path.resolve() == target_file.resolve():
+                # Já está no destino (organizado antes): nada a mover nem apagar
+                print(f"  [SKIPPED] Already organized: {file_path}")
+            elif not target_file.exists():
+                # rename(2) no mesmo disco; cópia só entre sistemas de arquivos (EXDEV)
+                fast_move(file_path, target_file)
+                moved += 1
+                msg = f"  [MOVED{' - NO EXIF' if not used_exif else ''}] {file_path} -> {target_file}"
                 print(msg)
-                skipped_unexpected_error += 1
-                continue
+            else:
+                # Arquivo já existe com o mesmo hash: duplicata real
+                file_path.unlink()
+                removed_src += 1
+                msg = f"  [REMOVED] {file_path} (duplicate hash), kept destination: {target_file}"
+                print(msg)
+
+            if not used_exif:
+                skipped_no_exif += 1
+        except Exception as e:
+            msg = f"  [ERROR] Unexpected error processing {file_path}: {e}"
+            print(msg)
+            skipped_unexpected_error += 1
+            continue
 
     print("\n[FINISHED]")
     print(f"Total analyzed files: {analyzed}")